@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+"""
+Benchmarks for hon commands over synthetic projects of increasing size.
+
+Projects are generated from hon's own templates, padded with modules, CHANGES
+blocks, dependencies and an ignored build tree. Stub `poetry`, `pyenv`, `git`,
+`pytest` and `flake8` executables are put first on the PATH, so the benchmarks
+run offline and measure hon's own overhead rather than the tools it drives.
+
+The git layer is also compared with GitPython on a repository with many untracked
+files, using the real git executable. The comparison is skipped if GitPython is not
+installed.
+
+Usage:
+
+    python benchmarks/bench_hon.py [--sizes small,medium,large] [--repeat 3]
+        [--git-files 50000]
+    python benchmarks/bench_hon.py --compare [--threshold 0.1]
+
+Each run is appended to a JSON history file. With --compare, the latest run is
+compared with the previous one and the script exits with status 1 if any
+benchmark slowed down by more than the threshold.
+"""
+from argparse import ArgumentParser
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import traceback
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from hon.changes import Changes  # noqa: E402
+from hon.project import Project  # noqa: E402
+from hon.templates import get_templates  # noqa: E402
+from hon.tools.git import Git  # noqa: E402
+
+
+DEFAULT_HISTORY = ROOT / "benchmarks" / "history.json"
+SIZES = {
+    "small": {"modules": 10, "changes": 10, "dependencies": 5, "build_files": 100},
+    "medium": {
+        "modules": 1000, "changes": 500, "dependencies": 50, "build_files": 10000
+    },
+    "large": {
+        "modules": 10000, "changes": 10000, "dependencies": 500,
+        "build_files": 100000
+    },
+}
+COMMANDS = ["create", "build", "install", "test", "lint", "clean", "change"]
+STUBS = {
+    # Emulate `poetry init --name NAME` by writing a minimal pyproject.toml, plus a
+    # LICENSE so that the license text is not downloaded
+    "poetry": """if [ "$1" = "init" ]; then
+    echo "Benchmark license" > LICENSE
+    cat > pyproject.toml <<EOF
+[tool.poetry]
+name = "$3"
+version = "0.1.0"
+description = ""
+authors = []
+
+[tool.poetry.dependencies]
+python = "^3.6"
+EOF
+fi""",
+    # `pyenv virtualenv VERSION NAME` creates a virtualenv with a stub pip
+    "pyenv": """case "$1" in
+    versions) echo "  3.6.8" ;;
+    install) [ "$2" = "--list" ] && printf "Available versions:\\n  3.6.8\\n" ;;
+    virtualenv)
+        mkdir -p "$PYENV_ROOT/versions/$3/bin"
+        printf '#!/bin/sh\\nexit 0\\n' > "$PYENV_ROOT/versions/$3/bin/pip"
+        chmod +x "$PYENV_ROOT/versions/$3/bin/pip" ;;
+esac""",
+    "git": "",
+    "pytest": "",
+    "flake8": "",
+    "sphinx-build": "",
+}
+
+
+def make_stubs(bin_dir: Path):
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for tool, body in STUBS.items():
+        stub = bin_dir / tool
+        stub.write_text(f"#!/bin/sh\n{body}\nexit 0\n")
+        stub.chmod(0o755)
+
+
+def write_pyproject(root: Path, name: str, dependencies: int):
+    deps = "\n".join(f'dep{i} = "^{i % 10}.0"' for i in range(dependencies))
+    (root / "pyproject.toml").write_text(f"""[tool.poetry]
+name = "{name}"
+version = "0.1.0"
+description = "Synthetic benchmark project"
+license = "MIT"
+authors = ["Hon Benchmarks <bench@example.com>"]
+
+[tool.poetry.dependencies]
+python = "^3.6"
+{deps}
+
+[tool.poetry.scripts]
+{name} = "{name}.__main__:main"
+""")
+    packages = "\n".join(
+        f'[[package]]\nname = "dep{i}"\nversion = "{i % 10}.0.0"\n'
+        f'category = "main"\noptional = false\npython-versions = "*"\n'
+        for i in range(dependencies)
+    )
+    (root / "poetry.lock").write_text(packages)
+
+
+def make_project(parent: Path, name: str, size: dict) -> Path:
+    """
+    Generates a synthetic project from hon's templates.
+    """
+    root = parent / name
+    root.mkdir(parents=True)
+    write_pyproject(root, name, size["dependencies"])
+    (root / "LICENSE").write_text("Benchmark license\n")
+    get_templates().create(root, {"project": Project(root)})
+    # The stub pyenv creates a virtualenv with a stub pip, for `install`
+    subprocess.check_call(["pyenv", "virtualenv", "3.6.8", name])
+
+    package = root / name
+    for i in range(size["modules"]):
+        subpackage = package / f"sub{i // 100}"
+        if not subpackage.exists():
+            subpackage.mkdir()
+            (subpackage / "__init__.py").touch()
+        (subpackage / f"module{i}.py").write_text(
+            f'"""Module {i}."""\n\n\ndef func{i}(x):\n    """Doubles x."""\n'
+            f"    return x * 2\n"
+        )
+
+    with open(root / "CHANGES.md", "wt") as out:
+        out.write(f"# {name} Changes\n\n## Unreleased\n\n* Pending change\n")
+        for i in range(size["changes"], 0, -1):
+            out.write(f"\n## 0.{i}.0 (2019-01-01)\n\n")
+            for j in range(5):
+                out.write(f"* Change {j} in release {i} (abcdef{j})\n")
+    return root
+
+
+def make_build_tree(root: Path, num_files: int):
+    build = root / "build"
+    if build.exists():
+        shutil.rmtree(build)
+    for i in range(num_files):
+        directory = build / f"lib{i // 1000}" / f"pkg{i // 100}"
+        if i % 100 == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"file{i}.o").touch()
+
+
+def run_hon(*args):
+    from hon.cli import hon
+    hon.main(list(args), prog_name="hon", standalone_mode=False)
+
+
+def has_command(name: str) -> bool:
+    from hon.cli import hon
+    return name in hon.commands
+
+
+def timed(fn, repeat: int, setup=None) -> float:
+    """
+    Returns the best wall time over `repeat` calls of `fn`.
+    """
+    best = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_size(work_dir: Path, size_name: str, repeat: int) -> dict:
+    size = SIZES[size_name]
+    name = f"bench_{size_name}"
+    root = make_project(work_dir, name, size)
+    results = {}
+
+    def record(bench, fn, setup=None):
+        if bench in COMMANDS and not has_command(bench):
+            print(f"Skipping {bench}: no such command")
+            results[bench] = None
+            return
+        try:
+            results[bench] = timed(fn, repeat, setup)
+        except Exception:
+            traceback.print_exc()
+            results[bench] = None
+
+    create_parent = work_dir / f"create_{size_name}"
+    counter = iter(range(repeat))
+    record(
+        "create",
+        lambda: run_hon("create", f"created{next(counter)}", "--parent",
+                        str(create_parent))
+    )
+    for command in ["build", "install", "test", "lint"]:
+        record(command, lambda: run_hon("--project", str(root), command))
+    record(
+        "clean",
+        lambda: run_hon("--project", str(root), "clean", "--force"),
+        setup=lambda: make_build_tree(root, size["build_files"])
+    )
+
+    counter = iter(range(repeat))
+    record(
+        "change",
+        lambda: run_hon("--project", str(root), "change", f"Change {next(counter)}")
+    )
+
+    def find_oldest_block():
+        # A new Changes object, so that the block index is loaded from disk
+        Changes(root / "CHANGES.md", root / ".hon" / "changes.json").find_block("0.1.0")
+
+    record("find_block", find_oldest_block)
+
+    project = Project(root)
+
+    def lookup():
+        project.name
+        project.get_attribute("tool.poetry.dependencies")
+
+    def uncached_lookup():
+        # Clears the attribute cache without re-parsing pyproject.toml
+        project._attr_cache.clear()
+        lookup()
+
+    # In-process operations are too fast to time individually, so each is the
+    # best mean over 100 calls
+    for bench, fn in [
+        ("refresh", project.refresh),
+        ("attr_lookup_uncached", uncached_lookup),
+        ("attr_lookup_cached", lookup),
+    ]:
+        results[bench] = min(timeit.repeat(fn, number=100, repeat=repeat)) / 100
+    return results
+
+
+def make_git_repo(parent: Path, num_files: int) -> Path:
+    root = parent / "git_repo"
+    for i in range(num_files):
+        directory = root / f"dir{i // 1000}"
+        if i % 1000 == 0:
+            directory.mkdir(parents=True)
+        (directory / f"file{i}.txt").write_text(f"{i}\n")
+    subprocess.check_call(["git", "init", "--quiet"], cwd=str(root))
+    return root
+
+
+def bench_git(work_dir: Path, num_files: int, repeat: int) -> dict:
+    """
+    Compares hon's git layer with GitPython: listing untracked files, staging them
+    all, and reading a sample of committed blobs.
+    """
+    root = make_git_repo(work_dir, num_files)
+    hon_git = Git(working_dir=root)
+    try:
+        import git
+        repo = git.Repo(str(root))
+    except ImportError:
+        print("Skipping GitPython comparison: GitPython is not installed")
+        repo = None
+    results = {}
+
+    def reset_index():
+        subprocess.check_call(["git", "read-tree", "--empty"], cwd=str(root))
+
+    results["hon_untracked"] = timed(lambda: hon_git.untracked_files, repeat)
+    if repo:
+        results["gitpython_untracked"] = timed(lambda: repo.untracked_files, repeat)
+
+    untracked = hon_git.untracked_files
+    results["hon_add"] = timed(lambda: hon_git.add(untracked), repeat, reset_index)
+    if repo:
+        results["gitpython_add"] = timed(
+            lambda: repo.index.add(untracked), repeat, reset_index
+        )
+
+    reset_index()
+    hon_git.add(untracked)
+    subprocess.check_call(
+        [
+            "git", "-c", "user.name=bench", "-c", "user.email=bench@example.com",
+            "commit", "--quiet", "-m", "bench"
+        ],
+        cwd=str(root)
+    )
+    sample = untracked[::max(1, len(untracked) // 1000)]
+    results["hon_read_objects"] = timed(
+        lambda: [hon_git.read_object(f"HEAD:{path}") for path in sample], repeat
+    )
+    if repo:
+        tree = repo.head.commit.tree
+        results["gitpython_read_objects"] = timed(
+            lambda: [tree[path].data_stream.read() for path in sample], repeat
+        )
+        repo.close()
+    hon_git.close()
+    return results
+
+
+def print_results(name: str, results: dict):
+    for bench, seconds in results.items():
+        shown = "n/a" if seconds is None else f"{seconds:.3g}s"
+        print(f"{name:<8} {bench:<22} {shown:>12}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=str(ROOT),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_history(path: Path) -> list:
+    if not path.exists():
+        return []
+    with open(path, "rt") as inp:
+        return json.load(inp)
+
+
+def compare(history: list, threshold: float) -> bool:
+    """
+    Compares the last two runs. Returns True if there are no regressions.
+    """
+    if len(history) < 2:
+        print("At least two runs are needed for a comparison")
+        return True
+    previous, latest = history[-2], history[-1]
+    print(f"Comparing {latest['commit']} to {previous['commit']}")
+    ok = True
+    for size_name, results in latest["results"].items():
+        for bench, seconds in results.items():
+            before = previous["results"].get(size_name, {}).get(bench)
+            if seconds is None or before is None:
+                continue
+            change = (seconds - before) / before
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                ok = False
+            print(
+                f"{size_name:<8} {bench:<22} {before:>10.3g}s -> {seconds:>10.3g}s "
+                f"({change:+.1%}){flag}"
+            )
+    return ok
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark hon commands")
+    parser.add_argument(
+        "--sizes", default="small,medium",
+        help=f"Comma-separated project sizes ({', '.join(SIZES)})"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Repetitions per benchmark (best of)"
+    )
+    parser.add_argument(
+        "--git-files", type=int, default=50000,
+        help="Files in the repository for the GitPython comparison (0 to skip)"
+    )
+    parser.add_argument(
+        "--history", type=Path, default=DEFAULT_HISTORY, help="JSON history file"
+    )
+    parser.add_argument(
+        "--compare", action="store_true",
+        help="Compare the last two runs in the history instead of running"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.1,
+        help="Relative slowdown reported as a regression"
+    )
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    if args.compare:
+        sys.exit(0 if compare(history, args.threshold) else 1)
+
+    # Resolve the commit before the stub git is put on the PATH
+    commit = git_commit()
+    work_dir = Path(tempfile.mkdtemp(prefix="hon-bench-"))
+    cwd = Path.cwd()
+    results = {}
+    try:
+        # The git comparison needs the real git, so it runs before stubbing
+        if args.git_files:
+            results["git"] = bench_git(work_dir, args.git_files, args.repeat)
+            print_results("git", results["git"])
+        bin_dir = work_dir / "bin"
+        make_stubs(bin_dir)
+        os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+        os.environ["PYENV_ROOT"] = str(work_dir / "pyenv")
+        for size_name in args.sizes.split(","):
+            results[size_name] = bench_size(work_dir, size_name, args.repeat)
+            print_results(size_name, results[size_name])
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir)
+
+    history.append({
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "results": results
+    })
+    args.history.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.history, "wt") as out:
+        json.dump(history, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import json
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+BLOCK_PREFIX = b"## "
+UNRELEASED = "Unreleased"
+COPY_BUFSIZE = 1024 * 1024
+
+
+class ChangesHead:
+    """
+    The parsed head of a CHANGES file: everything up to the end of the top-most
+    block. The remainder of the file is never parsed.
+
+    Args:
+        preamble: Lines before the first block (e.g. the document title).
+        title: Title of the top-most block, or None if there are no blocks.
+        lines: Lines of the top-most block, after the title.
+        end: Byte offset at which the rest of the file begins.
+        has_rest: Whether there are any blocks after the top-most block.
+    """
+    def __init__(
+        self, preamble: List[bytes], title: Optional[str], lines: List[bytes],
+        end: int, has_rest: bool
+    ):
+        self.preamble = preamble
+        self.title = title
+        self.lines = lines
+        self.end = end
+        self.has_rest = has_rest
+
+    @property
+    def entries(self) -> List[str]:
+        return [
+            line.decode("utf-8").rstrip()
+            for line in self.lines
+            if line.lstrip().startswith(b"*")
+        ]
+
+
+def block_version(title: str) -> str:
+    """
+    Returns the version from a block title such as '1.2.0 (2019-01-01)'.
+    """
+    return title.split(" ", 1)[0]
+
+
+class Changes:
+    """
+    Manages a CHANGES file without reading more of it than necessary. Only the
+    top-most block is parsed, and modifications rewrite the head of the file and
+    copy the remainder verbatim to a temporary file that atomically replaces the
+    original.
+
+    Block positions are kept in an index file, as offsets from the end of the
+    file, so they do not change when the head is rewritten. The index is rebuilt
+    with a single scan if the CHANGES file is modified by anything else.
+
+    Args:
+        path: Path to the CHANGES file.
+        index_path: Path to the block index. If None, the index is kept in memory
+            only.
+    """
+    def __init__(self, path: Path, index_path: Optional[Path] = None):
+        self.path = path
+        self.index_path = index_path
+        self._head = None
+        self._index = None
+
+    @property
+    def head(self) -> ChangesHead:
+        if self._head is None:
+            self._head = self._read_head()
+        return self._head
+
+    @property
+    def title(self) -> Optional[str]:
+        return self.head.title
+
+    @property
+    def is_unreleased(self) -> bool:
+        return self.title == UNRELEASED
+
+    def add_entry(self, description: str, subpoints: Sequence[str] = ()):
+        """
+        Adds an entry to the end of the top-most block, creating an 'Unreleased'
+        block if there are no blocks.
+
+        Args:
+            description: The change description.
+            subpoints: Additional points to add beneath the change.
+        """
+        if self.head.title is None:
+            self.new_block()
+        lines = self.head.lines
+        # Insert after the last non-blank line of the block, dropping the trailing
+        # blank lines; a single one is added back if another block follows
+        pos = len(lines)
+        while pos > 0 and not lines[pos - 1].strip():
+            pos -= 1
+        del lines[pos:]
+        if pos == 0:
+            lines.append(b"\n")
+        elif not lines[-1].endswith(b"\n"):
+            lines[-1] += b"\n"
+        lines.append(f"* {description}\n".encode("utf-8"))
+        lines.extend(f"    * {point}\n".encode("utf-8") for point in subpoints)
+        if self.head.has_rest:
+            lines.append(b"\n")
+        self._rewrite(self._render_head(), replaced=1)
+
+    def set_title(self, title: str):
+        """
+        Retitles the top-most block, e.g. to replace 'Unreleased' with a version.
+        """
+        if self.head.title is None:
+            raise ValueError(f"{self.path} does not contain any blocks")
+        self.head.title = title
+        self._rewrite(self._render_head(), replaced=1)
+
+    def new_block(self, title: str = UNRELEASED):
+        """
+        Adds a new, empty top-most block.
+        """
+        head = self.head
+        old_block = b""
+        if head.title is not None:
+            old_block = self._render_block(head.title, head.lines)
+            if not old_block.endswith(b"\n"):
+                old_block += b"\n"
+            head.has_rest = True
+        head.title = title
+        head.lines = [b"\n"]
+        new_head = self._render_head()
+        self._rewrite(new_head + old_block, replaced=1 if old_block else 0)
+        # The old top block is now part of the unparsed remainder
+        head.end = len(new_head)
+
+    def find_block(self, version: str) -> Optional[str]:
+        """
+        Returns the text of the block for `version`, or None if there is no such
+        block. Uses the block index so only the block itself is read.
+        """
+        blocks = self._index_blocks()
+        lookup = self._index["lookup"]
+        if version not in lookup:
+            return None
+        i = lookup[version]
+        size = self.path.stat().st_size
+        start = size - blocks[i][1]
+        end = size - blocks[i + 1][1] if i + 1 < len(blocks) else size
+        with open(self.path, "rb") as inp:
+            inp.seek(start)
+            return inp.read(end - start).decode("utf-8")
+
+    @property
+    def versions(self) -> List[str]:
+        return [block_version(title) for title, _ in self._index_blocks()]
+
+    def _read_head(self) -> ChangesHead:
+        preamble = []
+        title = None
+        lines = []
+        offset = 0
+        has_rest = False
+        with open(self.path, "rb") as inp:
+            for line in inp:
+                if line.startswith(BLOCK_PREFIX):
+                    if title is not None:
+                        has_rest = True
+                        break
+                    title = line[len(BLOCK_PREFIX):].decode("utf-8").strip()
+                elif title is None:
+                    preamble.append(line)
+                else:
+                    lines.append(line)
+                offset += len(line)
+        return ChangesHead(preamble, title, lines, offset, has_rest)
+
+    def _render_block(self, title: str, lines: List[bytes]) -> bytes:
+        return BLOCK_PREFIX + title.encode("utf-8") + b"\n" + b"".join(lines)
+
+    def _render_head(self) -> bytes:
+        head = self.head
+        rendered = b"".join(head.preamble)
+        if head.title is not None:
+            # Ensure the block is separated from the preamble by a blank line
+            if rendered and not rendered.endswith(b"\n\n"):
+                rendered += b"\n" if rendered.endswith(b"\n") else b"\n\n"
+            rendered += self._render_block(head.title, head.lines)
+        return rendered
+
+    def _rewrite(self, rendered: bytes, replaced: int):
+        """
+        Replaces the head of the file with `rendered`, copying the remainder of the
+        file unchanged, and updates the index.
+
+        Args:
+            rendered: The new head.
+            replaced: The number of blocks in the old head.
+        """
+        # Make sure the index is loaded before the file changes underneath it
+        blocks = self._index_blocks()
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f".{self.path.name}.", dir=str(self.path.parent)
+        )
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(rendered)
+                with open(self.path, "rb") as inp:
+                    inp.seek(self.head.end)
+                    shutil.copyfileobj(inp, out, COPY_BUFSIZE)
+            shutil.copymode(str(self.path), tmp_path)
+            os.replace(tmp_path, str(self.path))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.head.end = len(rendered)
+
+        # Offsets are relative to the end of the file, so only the blocks in the
+        # rewritten head need to be updated
+        size = self.path.stat().st_size
+        head_blocks = []
+        offset = 0
+        for line in rendered.splitlines(keepends=True):
+            if line.startswith(BLOCK_PREFIX):
+                title = line[len(BLOCK_PREFIX):].decode("utf-8").strip()
+                head_blocks.append([title, size - offset])
+            offset += len(line)
+        blocks[:replaced] = head_blocks
+        self._update_lookup()
+        self._save_index()
+
+    def _index_blocks(self) -> List[list]:
+        """
+        Returns the list of [title, offset_from_end] pairs, newest first, loading
+        or rebuilding the index as necessary.
+        """
+        if self._index is None:
+            self._index = self._load_index()
+            if self._index is None:
+                self._index = {"blocks": self._scan_blocks()}
+                self._update_lookup()
+                self._save_index()
+            else:
+                self._update_lookup()
+        return self._index["blocks"]
+
+    def _scan_blocks(self) -> List[list]:
+        size = self.path.stat().st_size
+        blocks = []
+        offset = 0
+        with open(self.path, "rb") as inp:
+            for line in inp:
+                if line.startswith(BLOCK_PREFIX):
+                    title = line[len(BLOCK_PREFIX):].decode("utf-8").strip()
+                    blocks.append([title, size - offset])
+                offset += len(line)
+        return blocks
+
+    def _update_lookup(self):
+        lookup: Dict[str, int] = {}
+        for i, (title, _) in enumerate(self._index["blocks"]):
+            lookup.setdefault(block_version(title), i)
+        self._index["lookup"] = lookup
+
+    def _file_key(self) -> Tuple[int, int]:
+        stat = self.path.stat()
+        return stat.st_size, stat.st_mtime_ns
+
+    def _load_index(self) -> Optional[dict]:
+        if self.index_path is None or not self.index_path.exists():
+            return None
+        with open(self.index_path, "rt") as inp:
+            index = json.load(inp)
+        if tuple(index.get("key", ())) != self._file_key():
+            return None
+        return index
+
+    def _save_index(self):
+        if self.index_path is None:
+            return
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.index_path, "wt") as out:
+            json.dump({
+                "key": self._file_key(),
+                "blocks": self._index["blocks"]
+            }, out)
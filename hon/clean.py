@@ -0,0 +1,264 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import re
+import shutil
+from typing import Iterable, Iterator, List, Optional, Set
+
+
+IGNORE_FILE = ".gitignore"
+NEVER_CLEAN = {".git"}
+
+
+class IgnoreRule:
+    """
+    A single compiled .gitignore pattern.
+
+    Args:
+        pattern: The pattern, as it appears in the ignore file.
+        base: Directory containing the ignore file, relative to the project root,
+            in posix form ("" for the root).
+    """
+    def __init__(self, pattern: str, base: str = ""):
+        self.base = f"{base}/" if base else ""
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        elif pattern.startswith("\\"):
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # Patterns with a slash anywhere but the end are relative to the base
+        # directory; all others match a name at any depth.
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        regex = _translate(pattern)
+        if not anchored:
+            regex = f"(?:.*/)?{regex}"
+        self._regex = re.compile(f"{regex}$", re.DOTALL)
+
+    def match(self, path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if not path.startswith(self.base):
+            return False
+        return self._regex.match(path[len(self.base):]) is not None
+
+
+def _translate(pattern: str) -> str:
+    """
+    Translates a gitignore glob into a regular expression.
+    """
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i) and i + 2 == n and \
+                (i == 0 or pattern[i - 1] == "/"):
+            parts.append(".*")
+            i += 2
+        elif c == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif c == "?":
+            parts.append("[^/]")
+            i += 1
+        elif c == "[":
+            j = pattern.find("]", i + 2)
+            if j < 0:
+                parts.append(re.escape(c))
+                i += 1
+            else:
+                cls = pattern[i + 1:j].replace("\\", "\\\\")
+                if cls.startswith("!"):
+                    cls = "^" + cls[1:]
+                parts.append(f"[{cls}]")
+                i = j + 1
+        elif c == "\\" and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(c))
+            i += 1
+    return "".join(parts)
+
+
+def parse_ignore_lines(lines: Iterable[str], base: str = "") -> List[IgnoreRule]:
+    rules = []
+    for line in lines:
+        line = line.rstrip("\n")
+        # Trailing spaces are ignored unless escaped
+        if not line.endswith("\\ "):
+            line = line.rstrip(" ")
+        if line and not line.startswith("#"):
+            rules.append(IgnoreRule(line, base))
+    return rules
+
+
+class IgnoreMatcher:
+    """
+    Matches paths against a stack of ignore rules. Rules from deeper ignore files
+    are added later and take precedence, and within a file the last matching rule
+    wins, as in git.
+
+    Args:
+        rules: Initial rules, e.g. from the config file.
+    """
+    def __init__(self, rules: Optional[List[IgnoreRule]] = None):
+        self.rules = list(rules or [])
+
+    @classmethod
+    def from_patterns(cls, patterns: Iterable[str]) -> "IgnoreMatcher":
+        return cls(parse_ignore_lines(patterns))
+
+    def add_ignore_file(self, path: Path, base: str = "") -> int:
+        """
+        Adds the rules from an ignore file.
+
+        Returns:
+            The number of rules added.
+        """
+        with open(path, "rt") as inp:
+            rules = parse_ignore_lines(inp, base)
+        self.rules.extend(rules)
+        return len(rules)
+
+    def pop(self, num_rules: int):
+        if num_rules:
+            del self.rules[-num_rules:]
+
+    def is_ignored(self, path: str, is_dir: bool = False) -> bool:
+        for rule in reversed(self.rules):
+            if rule.match(path, is_dir):
+                return not rule.negate
+        return False
+
+
+def iter_clean_candidates(
+    root_dir: Path, matcher: IgnoreMatcher, untracked: Optional[Set[str]] = None,
+    tracked: Iterable[str] = ()
+) -> Iterator[Path]:
+    """
+    Walks the project directory and yields paths to be cleaned. Files tracked by
+    git are never yielded, even if they match an ignore pattern. Ignored
+    directories that contain no tracked files are yielded as a single entry and
+    are never descended into.
+
+    Args:
+        root_dir: The project root directory.
+        matcher: Matcher initialized with any extra patterns; .gitignore files are
+            added as they are encountered.
+        untracked: Paths (relative to `root_dir`) of untracked files, which are
+            also yielded.
+        tracked: Paths (relative to `root_dir`, in posix form) of files tracked by
+            git.
+    """
+    tracked = set(tracked)
+    tracked_dirs = set()
+    for path in tracked:
+        parent = path.rpartition("/")[0]
+        while parent and parent not in tracked_dirs:
+            tracked_dirs.add(parent)
+            parent = parent.rpartition("/")[0]
+    yield from _walk(
+        root_dir, "", matcher, untracked or set(), tracked, tracked_dirs, False
+    )
+
+
+def _walk(
+    directory: Path, rel_dir: str, matcher: IgnoreMatcher, untracked: Set[str],
+    tracked: Set[str], tracked_dirs: Set[str], in_ignored: bool
+) -> Iterator[Path]:
+    # Everything below an ignored directory is ignored, so its ignore file is moot
+    num_rules = 0
+    ignore_file = directory / IGNORE_FILE
+    if not in_ignored and ignore_file.is_file():
+        num_rules = matcher.add_ignore_file(ignore_file, rel_dir)
+    try:
+        with os.scandir(directory) as entries:
+            entries = sorted(entries, key=lambda e: e.name)
+        for entry in entries:
+            if entry.name in NEVER_CLEAN:
+                continue
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if rel_path in tracked:
+                continue
+            is_dir = entry.is_dir(follow_symlinks=False)
+            ignored = in_ignored or matcher.is_ignored(rel_path, is_dir)
+            if is_dir and rel_path in tracked_dirs:
+                # Descend rather than deleting tracked files along with the tree
+                yield from _walk(
+                    Path(entry.path), rel_path, matcher, untracked, tracked,
+                    tracked_dirs, ignored
+                )
+            elif ignored:
+                yield Path(entry.path)
+            elif is_dir:
+                yield from _walk(
+                    Path(entry.path), rel_path, matcher, untracked, tracked,
+                    tracked_dirs, False
+                )
+            elif rel_path in untracked:
+                yield Path(entry.path)
+    finally:
+        matcher.pop(num_rules)
+
+
+def delete_paths(paths: Iterable[Path], jobs: Optional[int] = None) -> int:
+    """
+    Deletes files and directory trees in parallel. The immediate children of each
+    directory are deleted as separate tasks so that a single large tree is also
+    spread across workers.
+
+    Args:
+        paths: The paths to delete.
+        jobs: Maximum number of worker threads; defaults to the
+            `ThreadPoolExecutor` default.
+
+    Returns:
+        The number of top-level paths deleted.
+    """
+    directories: List[Path] = []
+    count = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = []
+        for path in paths:
+            count += 1
+            if path.is_dir() and not path.is_symlink():
+                directories.append(path)
+                with os.scandir(path) as entries:
+                    futures.extend(
+                        executor.submit(
+                            _delete, Path(entry.path),
+                            entry.is_dir(follow_symlinks=False)
+                        )
+                        for entry in entries
+                    )
+            else:
+                futures.append(executor.submit(_delete, path, False))
+        for future in futures:
+            future.result()
+    for directory in directories:
+        directory.rmdir()
+    return count
+
+
+def _delete(path: Path, is_tree: bool):
+    if is_tree:
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def tee(items: Iterable[Path], seen: List[Path]) -> Iterator[str]:
+    """
+    Yields a display line per item while recording the items in `seen`, so that a
+    candidate stream can be paged and then deleted without walking twice.
+    """
+    for item in items:
+        seen.append(item)
+        yield f"{item}\n"
@@ -1,12 +1,17 @@
 from pathlib import Path
+import shlex
 from typing import Optional, Sequence
 
 import autoclick as ac
 import click
-from git import Repo
 
+from hon.clean import delete_paths, tee
 from hon.config import Config
+from hon.profiling import enable_profiling
 from hon.project import Project
+from hon.publish import Repository
+from hon.tools.docker import Docker
+from hon.tools.git import Git
 from hon.tools.poetry import Poetry
 
 
@@ -17,7 +22,8 @@ def get_project(ctx: click.Context):
 @ac.group(pass_context=True)
 def hon(
     ctx: click.Context, project: Optional[Path] = None,
-    config: Optional[ac.ReadableDir] = None
+    config: Optional[ac.ReadableDir] = None, profile: Optional[Path] = None,
+    profile_python: bool = False
 ):
     """
     Base command. Parses pyproject.toml and adds it to the context.
@@ -26,17 +32,35 @@ def hon(
         ctx: The click context.
         project: The project directory. Defaults to the current working directory.
         config: Configuration directory; defaults to `$HOME/.hon`.
+        profile: Record the time and resources used by every command hon runs,
+            and write a Chrome trace-event timeline to this file.
+        profile_python: With --profile, also profile hon's own Python code and
+            write the cProfile stats to `{profile}.pstats`.
     """
     ctx.ensure_object(dict)
 
+    if profile:
+        profiler = enable_profiling(python=profile_python)
+
+        def write_profile():
+            profiler.stop()
+            profiler.write_trace(profile)
+            if profile_python:
+                profiler.write_python_profile(Path(f"{profile}.pstats"))
+            click.echo(profiler.summary(), err=True)
+
+        ctx.call_on_close(write_profile)
+
     if project is None:
         project = Path.cwd()
+    pyproject = None
     try:
         ctx.obj["project"] = Project(project)
+        pyproject = ctx.obj["project"].pyproject
     except FileNotFoundError:
         pass
 
-    ctx.obj["config"] = Config(config)
+    ctx.obj["config"] = Config(config, project_dir=project, pyproject=pyproject)
 
 
 @hon.command(pass_context=True)
@@ -58,7 +82,7 @@ def create(ctx: click.Context, name: str, parent: Optional[Path] = None):
     else:
         project_dir.mkdir(parents=True)
 
-    git_repo = Repo.init(str(project_dir))
+    git = Git.init(project_dir, ctx.obj["config"].get_tool("git"))
 
     # Call the `poetry init` command, which should result in
     # the creation of the pyproject.toml file
@@ -66,7 +90,7 @@ def create(ctx: click.Context, name: str, parent: Optional[Path] = None):
     poetry.init(name)
 
     # Now initialize the project directory
-    project = Project(project_dir, git_repo=git_repo)
+    project = Project(project_dir, git=git)
     project.init()
 
 
@@ -145,7 +169,22 @@ def lock(ctx: click.Context):
     project.lock_dependencies()
 
 
-@hon.command()
+@hon.command(pass_context=True)
+def sync(ctx: click.Context, dev: bool = True, dry_run: bool = False):
+    """
+    Make the virtualenv match poetry.lock, changing only the packages that differ.
+
+    Args:
+        ctx: The Click context.
+        dev: Whether to include development dependencies.
+        dry_run: Only show the changes that would be made.
+    """
+    project = get_project(ctx)
+    plan = project.sync(dev=dev, dry_run=dry_run)
+    click.echo(plan.describe())
+
+
+@hon.command(pass_context=True)
 def test(
     ctx: click.Context,
     tests: Optional[Sequence[str]] = None,
@@ -164,3 +203,142 @@ def test(
     """
     project = get_project(ctx)
     project.test(tests=tests, debug=debug)
+
+
+@hon.command(pass_context=True)
+def clean(
+    ctx: click.Context, untracked: bool = False, force: bool = False,
+    jobs: Optional[int] = None
+):
+    """
+    Delete transient files: everything matching .gitignore patterns or the clean
+    patterns in config.toml.
+
+    Args:
+        ctx: The Click context.
+        untracked: Also delete files that are not tracked by git.
+        force: Do not ask for confirmation.
+        jobs: Number of parallel deletion workers.
+    """
+    project = get_project(ctx)
+    candidates = project.clean_candidates(
+        untracked=untracked, patterns=ctx.obj["config"].get_clean_patterns()
+    )
+    if not force:
+        paths = []
+        click.echo_via_pager(tee(candidates, paths))
+        # The pager may have been closed before the stream was exhausted
+        paths.extend(candidates)
+        if not paths:
+            click.echo("Nothing to clean")
+            return
+        if not click.confirm(f"Delete {len(paths)} paths?"):
+            return
+        candidates = paths
+    num_deleted = delete_paths(candidates, jobs)
+    click.echo(f"Deleted {num_deleted} paths")
+
+
+@hon.command(pass_context=True)
+def change(
+    ctx: click.Context, description: str, subpoints: Optional[Sequence[str]] = None
+):
+    """
+    Add an entry to the current (top-most) block of the CHANGES file.
+
+    Args:
+        ctx: The Click context.
+        description: The change description.
+        subpoints: Additional points to add beneath the change.
+    """
+    project = get_project(ctx)
+    project.changes.add_entry(description, subpoints or ())
+
+
+@hon.command(pass_context=True)
+def publish(
+    ctx: click.Context, repository: str = "pypi", build: bool = False, jobs: int = 4,
+    docker: bool = False, tag: Optional[str] = None, cmd: Optional[str] = None
+):
+    """
+    Upload the distribution files for the current version to a package repository.
+    Files the repository already has are skipped, so a failed publish can simply be
+    re-run.
+
+    Args:
+        ctx: The Click context.
+        repository: Name of the repository, as configured in .pypirc or config.toml.
+        build: Build the project before publishing.
+        jobs: Maximum number of concurrent uploads.
+        docker: Build and push a Docker image instead.
+        tag: The Docker image tag; defaults to `{name}:{version}`.
+        cmd: The Docker CMD, as a shell-style string.
+    """
+    project = get_project(ctx)
+    if build:
+        project.build()
+    if docker:
+        docker_tool = Docker(ctx.obj["config"].get_tool("docker"), project.root_dir)
+        if tag is None:
+            tag = f"{project.name}:{project.version}"
+        stats = project.docker_build(
+            docker_tool, tag=tag, cmd=shlex.split(cmd) if cmd else None
+        )
+        click.echo(stats.report())
+        docker_tool.push(tag)
+        return
+    repo = Repository.from_config(
+        repository, ctx.obj["config"].get_repository(repository)
+    )
+    uploaded, skipped = project.publish(repo, jobs=jobs)
+    for artifact in uploaded:
+        click.echo(f"Uploaded {artifact.name}")
+    for artifact in skipped:
+        click.echo(f"Skipped {artifact.name} (already uploaded)")
+
+
+@hon.command(pass_context=True)
+def lint(ctx: click.Context, report: Optional[Path] = None):
+    """
+    Run the flake8 linter. Issues are sorted by file and then by line number.
+
+    Args:
+        ctx: The Click context.
+        report: Write the report to this file and open it in an editor, rather than
+            printing it.
+    """
+    project = get_project(ctx)
+    issues = project.lint()
+    if report:
+        with open(report, "wt") as out:
+            out.writelines(f"{issue}\n" for issue in issues)
+        click.edit(filename=str(report))
+    else:
+        for issue in issues:
+            click.echo(issue)
+
+
+@hon.command(pass_context=True)
+def docs(
+    ctx: click.Context, force: bool = False, jobs: str = "auto", browser: bool = True
+):
+    """
+    Build the project documentation and open the index file in a browser. The
+    build is skipped if nothing the documentation depends on has changed.
+
+    Args:
+        ctx: The Click context.
+        force: Build even if nothing has changed.
+        jobs: Number of parallel Sphinx processes, or 'auto'.
+        browser: Open the index file in a browser.
+    """
+    project = get_project(ctx)
+    pages = project.docs(force=force, jobs=jobs)
+    if pages is None:
+        click.echo("Documentation is up to date")
+    else:
+        click.echo(f"Rebuilt {len(pages)} page(s)")
+        for page in pages:
+            click.echo(f"  {page}")
+    if browser:
+        click.launch(str(project.root_dir / "docs" / "_build" / "html" / "index.html"))
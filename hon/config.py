@@ -1,15 +1,146 @@
+import hashlib
+import marshal
+import os
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Mapping, Optional, Tuple
 
+from hon.profiling import profile
 from hon.utils import read_toml
 
 
 DEFAULT_PATH = Path.home() / ".hon"
 DEFAULT_CONFIG = {}
+CONFIG_FILE = "config.toml"
+PYPROJECT_FILE = "pyproject.toml"
+CACHE_DIR = "cache"
+ENV_PREFIX = "HON_"
+# Increment when the structure of Settings changes, to invalidate old snapshots
+SNAPSHOT_VERSION = 1
+
+
+class InvalidConfigError(Exception):
+    pass
+
+
+class Settings:
+    """
+    Validated, merged configuration.
+
+    Args:
+        tools: Mapping of tool name to executable.
+        clean_patterns: Additional ignore patterns for the `clean` command.
+        repositories: Mapping of repository name to repository settings.
+    """
+    __slots__ = ("tools", "clean_patterns", "repositories")
+
+    def __init__(
+        self, tools: Dict[str, str], clean_patterns: List[str],
+        repositories: Dict[str, Dict[str, str]]
+    ):
+        self.tools = tools
+        self.clean_patterns = clean_patterns
+        self.repositories = repositories
+
+    @classmethod
+    def validate(cls, config: Mapping) -> "Settings":
+        """
+        Creates Settings from a merged config dict, raising InvalidConfigError if
+        any value has the wrong type.
+        """
+        tools = _check_mapping(config.get("tools", {}), "tools")
+        for name, executable in tools.items():
+            _check_type(executable, str, f"tools.{name}")
+
+        clean = _check_mapping(config.get("clean", {}), "clean")
+        patterns = _check_type(clean.get("patterns", []), list, "clean.patterns")
+        for pattern in patterns:
+            _check_type(pattern, str, "clean.patterns")
+
+        repositories = _check_mapping(config.get("repositories", {}), "repositories")
+        for name, settings in repositories.items():
+            _check_mapping(settings, f"repositories.{name}")
+            for key, value in settings.items():
+                _check_type(value, str, f"repositories.{name}.{key}")
+
+        return cls(
+            dict(tools), list(patterns),
+            {name: dict(settings) for name, settings in repositories.items()}
+        )
+
+    def to_tuple(self) -> tuple:
+        return tuple(getattr(self, attr) for attr in self.__slots__)
+
+
+def _check_type(value, expected: type, key: str):
+    if not isinstance(value, expected):
+        raise InvalidConfigError(
+            f"Config value {key} must be of type {expected.__name__}, not "
+            f"{type(value).__name__}"
+        )
+    return value
+
+
+def _check_mapping(value, key: str) -> Mapping:
+    return _check_type(value, dict, key)
+
+
+def merge(base: dict, override: Mapping) -> dict:
+    """
+    Recursively merges `override` into a copy of `base`.
+    """
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, Mapping) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def env_layer(environ: Mapping[str, str]) -> dict:
+    """
+    Builds a config layer from environment variables:
+
+    * HON_TOOL_{NAME}: the executable for tool {name}
+    * HON_CLEAN_PATTERNS: additional clean patterns, separated by os.pathsep
+    """
+    layer = {}
+    tool_prefix = f"{ENV_PREFIX}TOOL_"
+    for key, value in environ.items():
+        if key.startswith(tool_prefix):
+            layer.setdefault("tools", {})[key[len(tool_prefix):].lower()] = value
+    patterns = environ.get(f"{ENV_PREFIX}CLEAN_PATTERNS")
+    if patterns:
+        layer["clean"] = {"patterns": patterns.split(os.pathsep)}
+    return layer
 
 
 class Config:
-    def __init__(self, path: Optional[Path] = None):
+    """
+    Configuration merged from, in increasing order of precedence, the user config
+    file, the `[tool.hon]` section of the project's pyproject.toml, and HON_*
+    environment variables.
+
+    The validated result is cached as a marshal snapshot, keyed by the mtimes and
+    sizes of the source files and by the environment layer, so TOML files are only
+    parsed when they change.
+
+    The snapshot may contain repository credentials, so it is only readable by the
+    user.
+
+    Args:
+        path: Configuration directory; defaults to `$HOME/.hon`.
+        project_dir: The project directory, if any.
+        environ: Environment variables; defaults to `os.environ`.
+        pyproject: The project's already parsed pyproject.toml, if any, which is
+            then not parsed again.
+    """
+    @profile("load config")
+    def __init__(
+        self, path: Optional[Path] = None, project_dir: Optional[Path] = None,
+        environ: Optional[Mapping[str, str]] = None,
+        pyproject: Optional[Mapping] = None
+    ):
         if path and not path.exists():
             raise FileNotFoundError(f"Config directory {path} does not exist")
 
@@ -17,11 +148,89 @@ class Config:
             path = DEFAULT_PATH
 
         self.path = path
-
+        self._pyproject = pyproject
+        self._sources = []
         if self.path:
-            self._config = read_toml(self.path / "config.toml")
-        else:
-            self._config = DEFAULT_CONFIG
+            self._sources.append(self.path / CONFIG_FILE)
+        if project_dir:
+            self._sources.append(project_dir / PYPROJECT_FILE)
+        self._env = env_layer(os.environ if environ is None else environ)
+        self.settings = self._load()
+
+    @property
+    def snapshot_path(self) -> Optional[Path]:
+        if not self.path:
+            return None
+        # One snapshot per combination of source files
+        sources = "\0".join(str(source) for source in self._sources)
+        name = hashlib.sha1(sources.encode("utf-8")).hexdigest()[:16]
+        return self.path / CACHE_DIR / f"config-{name}.marshal"
+
+    def _key(self) -> tuple:
+        key = [SNAPSHOT_VERSION]
+        for source in self._sources:
+            try:
+                stat = source.stat()
+                key.append((str(source), stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                key.append((str(source), None, None))
+        key.append(repr(sorted(self._env.items())))
+        return tuple(key)
+
+    def _load(self) -> Settings:
+        key = self._key()
+        snapshot = self._read_snapshot(key)
+        if snapshot is not None:
+            return Settings(*snapshot)
+
+        config = DEFAULT_CONFIG
+        for source in self._sources:
+            if source.name == PYPROJECT_FILE and self._pyproject is not None:
+                layer = self._pyproject
+            elif source.exists():
+                layer = read_toml(source)
+            else:
+                continue
+            if source.name == PYPROJECT_FILE:
+                layer = layer.get("tool", {}).get("hon", {})
+            config = merge(config, layer)
+        settings = Settings.validate(merge(config, self._env))
+        self._write_snapshot(key, settings)
+        return settings
+
+    def _read_snapshot(self, key: tuple) -> Optional[Tuple]:
+        snapshot_path = self.snapshot_path
+        if snapshot_path is None or not snapshot_path.exists():
+            return None
+        try:
+            with open(snapshot_path, "rb") as inp:
+                snapshot_key, values = marshal.load(inp)
+        except (EOFError, ValueError, TypeError):
+            return None
+        return values if snapshot_key == key else None
+
+    def _write_snapshot(self, key: tuple, settings: Settings):
+        snapshot_path = self.snapshot_path
+        if snapshot_path is None:
+            return
+        try:
+            snapshot_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            tmp_path = snapshot_path.with_suffix(".tmp")
+            fd = os.open(str(tmp_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            # The mode is only applied to new files
+            os.fchmod(fd, 0o600)
+            with os.fdopen(fd, "wb") as out:
+                marshal.dump((key, settings.to_tuple()), out)
+            os.replace(str(tmp_path), str(snapshot_path))
+        except OSError:
+            # The cache is an optimization; a read-only config dir is not an error
+            pass
+
+    def get_tool(self, name: str) -> str:
+        return self.settings.tools.get(name, name)
+
+    def get_clean_patterns(self) -> List[str]:
+        return self.settings.clean_patterns
 
-    def get_tool(self, name: str):
-        return self._config.get("tools", {}).get(name, name)
+    def get_repository(self, name: str) -> dict:
+        return self.settings.repositories.get(name, {})
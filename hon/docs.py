@@ -0,0 +1,160 @@
+import ast
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+from typing import Dict, Iterator, List, Optional
+
+
+# In parallel mode, Sphinx reports chunks of pages as 'first .. last'
+WRITING_RE = re.compile(r"writing output\.\.\. \[\s*\d+%\] (.+?)\s*$")
+
+
+def _docstring_digest(path: Path) -> str:
+    """
+    Hashes the parts of a python module that appear in API documentation: the
+    docstrings, decorators and signatures (including return annotations) of
+    classes and functions, and all other module- and class-level statements, such
+    as `__version__` assignments. Changes to function bodies do not change the
+    digest.
+    """
+    with open(path, "rb") as inp:
+        source = inp.read()
+    try:
+        tree = ast.parse(source, str(path))
+    except SyntaxError:
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    defs = (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Module,) + defs):
+            continue
+        if isinstance(node, defs):
+            decorators = "".join(ast.dump(dec) for dec in node.decorator_list)
+            digest.update(f"@{decorators}".encode("utf-8"))
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            returns = ast.dump(node.returns) if node.returns else ""
+            digest.update(
+                f"def {node.name}{ast.dump(node.args)}->{returns}".encode("utf-8")
+            )
+        else:
+            if isinstance(node, ast.ClassDef):
+                bases = "".join(
+                    ast.dump(base) for base in node.bases + node.keywords
+                )
+                digest.update(f"class {node.name}({bases})".encode("utf-8"))
+            # Statements in function bodies are not documented, but those in
+            # module and class bodies can be (e.g. attributes, or a version
+            # read by conf.py)
+            for stmt in node.body:
+                if not isinstance(stmt, defs):
+                    digest.update(ast.dump(stmt).encode("utf-8"))
+        docstring = ast.get_docstring(node, clean=False)
+        if docstring:
+            digest.update(docstring.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _file_digest(path: Path) -> str:
+    with open(path, "rb") as inp:
+        return hashlib.sha256(inp.read()).hexdigest()
+
+
+class DocsStamp:
+    """
+    Fingerprint of everything a documentation build depends on: the docs sources
+    (including the Sphinx config) and the docstrings of the package. Per-file
+    digests are cached by mtime and size, so only changed files are re-read.
+
+    Args:
+        path: Path of the stamp file.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.fingerprint = None
+        self.files: Dict[str, list] = {}
+        if path.exists():
+            with open(path, "rt") as inp:
+                stamp = json.load(inp)
+            self.fingerprint = stamp.get("fingerprint")
+            self.files = stamp.get("files", {})
+
+    def compute(self, docs_dir: Path, package_dir: Path, exclude: Path) -> str:
+        """
+        Computes the fingerprint of the current sources, updating the per-file
+        digest cache.
+
+        Args:
+            docs_dir: The Sphinx source directory.
+            package_dir: The python package directory.
+            exclude: Directory to ignore (the build output).
+        """
+        files = {}
+        overall = hashlib.sha256()
+        sources = [
+            (path, _file_digest) for path in _iter_files(docs_dir, exclude)
+        ] + [
+            (path, _docstring_digest) for path in sorted(package_dir.rglob("*.py"))
+        ]
+        for path, digest_fn in sources:
+            stat = path.stat()
+            key = str(path)
+            cached = self.files.get(key)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                digest = cached[2]
+            else:
+                digest = digest_fn(path)
+            files[key] = [stat.st_mtime_ns, stat.st_size, digest]
+            overall.update(f"{key}\0{digest}\0".encode("utf-8"))
+        self.files = files
+        return overall.hexdigest()
+
+    def save(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "wt") as out:
+            json.dump({"fingerprint": fingerprint, "files": self.files}, out)
+
+
+def _iter_files(directory: Path, exclude: Path) -> Iterator[Path]:
+    """
+    Yields the files under `directory`, in sorted order. `exclude` (the build
+    output) is pruned from the walk, so its files are never listed.
+    """
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(str(directory), followlinks=True):
+        parent = Path(dirpath)
+        dirnames[:] = [name for name in dirnames if parent / name != exclude]
+        paths.extend(
+            parent / name for name in filenames if (parent / name).is_file()
+        )
+    yield from sorted(paths)
+
+
+def sphinx_command(
+    docs_dir: Path, output_dir: Path, doctree_dir: Path, jobs: Optional[str] = "auto",
+    builder: str = "html"
+) -> List[str]:
+    """
+    Returns a sphinx-build command that reads and writes in parallel and keeps the
+    environment pickle and doctrees in `doctree_dir`, so that unchanged pages are
+    not re-read.
+    """
+    cmd = ["sphinx-build", "-b", builder, "-d", str(doctree_dir)]
+    if jobs:
+        cmd.extend(["-j", str(jobs)])
+    cmd.extend([str(docs_dir), str(output_dir)])
+    return cmd
+
+
+def written_pages(lines: Iterator[str]) -> List[str]:
+    """
+    Parses the names of the pages Sphinx wrote from its output.
+    """
+    pages = []
+    for line in lines:
+        match = WRITING_RE.search(line)
+        if match:
+            pages.append(match.group(1))
+    return pages
@@ -0,0 +1,202 @@
+from contextlib import contextmanager
+import cProfile
+import functools
+import json
+import os
+from pathlib import Path
+import resource
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+PROFILER = None
+
+
+class Span:
+    """
+    A single timed operation.
+
+    Args:
+        name: Display name.
+        category: Category, e.g. 'subprocess' or 'hon'.
+        start: Start time, in seconds since the profiler was created.
+        wall: Elapsed wall time, in seconds.
+        cpu: CPU time (user + system), in seconds. For a command, this is the CPU
+            time of the child process; otherwise it is that of hon and of any child
+            processes that finished during the span.
+        peak_rss: Peak resident memory, in KB. For a command, this is the peak of
+            the child process; otherwise it is hon's own high-water mark at the end
+            of the span.
+        tid: ID of the thread that ran the operation.
+        args: Additional details, e.g. the command line.
+    """
+    def __init__(
+        self, name: str, category: str, start: float, wall: float, cpu: float,
+        peak_rss: int, tid: int, args: Dict[str, str]
+    ):
+        self.name = name
+        self.category = category
+        self.start = start
+        self.wall = wall
+        self.cpu = cpu
+        self.peak_rss = peak_rss
+        self.tid = tid
+        self.args = args
+
+    def to_trace_event(self, pid: int) -> dict:
+        args = dict(self.args)
+        args.update(cpu_ms=round(self.cpu * 1000, 3), peak_rss_kb=self.peak_rss)
+        return {
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": round(self.start * 1e6),
+            "dur": round(self.wall * 1e6),
+            "pid": pid,
+            "tid": self.tid,
+            "args": args
+        }
+
+
+def _cpu_times() -> float:
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def _peak_rss() -> int:
+    # RUSAGE_CHILDREN is not used, as it is the peak of the largest child that has
+    # finished so far, not of the children run during the span
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Profiler:
+    """
+    Records spans for commands and in-process phases, and optionally profiles
+    hon's own Python code with cProfile.
+
+    Args:
+        python: Whether to also capture a cProfile profile.
+    """
+    def __init__(self, python: bool = False):
+        self.spans: List[Span] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._cprofile = cProfile.Profile() if python else None
+
+    def start(self):
+        if self._cprofile:
+            self._cprofile.enable()
+
+    def stop(self):
+        if self._cprofile:
+            self._cprofile.disable()
+
+    @contextmanager
+    def span(self, name: str, category: str = "hon", **args):
+        """
+        Records a span for the enclosed operation. The context value is a list, to
+        which the resource usage (as returned by `os.wait4`) of the child process
+        that performs the operation should be added. The span then reports the CPU
+        time and peak RSS of that process rather than hon's.
+        """
+        start = time.perf_counter()
+        cpu = _cpu_times()
+        children: List[resource.struct_rusage] = []
+        try:
+            yield children
+        finally:
+            end = time.perf_counter()
+            if children:
+                span_cpu = sum(usage.ru_utime + usage.ru_stime for usage in children)
+                peak_rss = max(usage.ru_maxrss for usage in children)
+            else:
+                span_cpu = _cpu_times() - cpu
+                peak_rss = _peak_rss()
+            span = Span(
+                name, category, start - self._origin, end - start, span_cpu,
+                peak_rss, threading.get_ident(),
+                {key: str(value) for key, value in args.items()}
+            )
+            with self._lock:
+                self.spans.append(span)
+
+    def write_trace(self, path: Path):
+        """
+        Writes the spans in the Chrome trace-event format, which can be loaded in
+        chrome://tracing or Perfetto.
+        """
+        pid = os.getpid()
+        with open(path, "wt") as out:
+            json.dump({
+                "traceEvents": [span.to_trace_event(pid) for span in self.spans],
+                "displayTimeUnit": "ms"
+            }, out)
+
+    def write_python_profile(self, path: Path):
+        if self._cprofile:
+            self._cprofile.dump_stats(str(path))
+
+    def summary(self) -> str:
+        """
+        Returns a table of spans aggregated by name, sorted by total wall time.
+        """
+        totals: Dict[str, list] = {}
+        for span in self.spans:
+            row = totals.setdefault(span.name, [span.category, 0, 0.0, 0.0, 0])
+            row[1] += 1
+            row[2] += span.wall
+            row[3] += span.cpu
+            row[4] = max(row[4], span.peak_rss)
+        rows = sorted(totals.items(), key=lambda item: item[1][2], reverse=True)
+        width = max([len(name) for name in totals] + [4])
+        lines = [
+            f"{'name':<{width}}  {'category':<10}  {'calls':>5}  {'wall (s)':>9}  "
+            f"{'cpu (s)':>9}  {'peak rss (MB)':>13}"
+        ]
+        for name, (category, calls, wall, cpu, peak_rss) in rows:
+            lines.append(
+                f"{name:<{width}}  {category:<10}  {calls:>5}  {wall:>9.3f}  "
+                f"{cpu:>9.3f}  {peak_rss / 1024:>13.1f}"
+            )
+        return "\n".join(lines)
+
+
+def enable_profiling(python: bool = False) -> Profiler:
+    global PROFILER
+    PROFILER = Profiler(python)
+    PROFILER.start()
+    return PROFILER
+
+
+def get_profiler() -> Optional[Profiler]:
+    return PROFILER
+
+
+@contextmanager
+def profiled(name: str, category: str = "hon", **args):
+    """
+    Records a span if profiling is enabled; otherwise does nothing. The context
+    value is that of :meth:`Profiler.span`, or None if profiling is disabled.
+    """
+    if PROFILER is None:
+        yield None
+    else:
+        with PROFILER.span(name, category, **args) as children:
+            yield children
+
+
+def profile(name: str, category: str = "hon"):
+    """
+    Decorator that records a span for each call to the decorated function.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profiled(name, category):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,14 +1,32 @@
 from pathlib import Path
-from typing import Optional, Sequence
+import re
+import subprocess
+from typing import Iterator, List, Optional, Sequence
+from urllib.parse import urlsplit
 from urllib.request import urlopen
 
-from git import Repo
-
 from hon import CommandError
+from hon.changes import Changes
+from hon.clean import IgnoreMatcher, iter_clean_candidates
+from hon.docs import DocsStamp, sphinx_command, written_pages
+from hon.publish import (
+    Artifact, Repository, UploadState, parse_dist_filename, upload_artifacts
+)
+from hon.requirements import versions_equal
+from hon.sync import (
+    WHEEL_CACHE, SyncPlan, cached_wheels, canonicalize, installed_distributions,
+    is_direct_reference, locked_packages, target_environment, wheel_cache_dir
+)
 from hon.templates import get_templates
-from hon.utils import read_toml, run_cmd
+from hon.tools.docker import (
+    DEFAULT_BASE_IMAGE, CacheStats, Docker, write_dockerfile
+)
+from hon.tools.git import Git
+from hon.utils import STREAM, read_toml, run_cmd
 
 
+CHANGES_FILE = "CHANGES.md"
+CACHE_DIR = ".hon"
 LICENSE_URL = \
     "https://raw.githubusercontent.com/spdx/license-list-data/master/text/{license}.txt"
 
@@ -23,8 +41,15 @@ class UnknownLicenseError(Exception):
         self.license_name = license_name
 
 
+def _lint_sort_key(line: str):
+    path, line_num, col, _ = (line.split(":", 3) + ["", "", ""])[:4]
+    if line_num.isdigit() and col.isdigit():
+        return path, int(line_num), int(col)
+    return path, 0, 0
+
+
 class Project:
-    def __init__(self, root_dir: Path, git_repo: Optional[Repo] = None):
+    def __init__(self, root_dir: Path, git: Optional[Git] = None):
         print(root_dir)
         self.root_dir = root_dir
         self._pyproject_file = root_dir / "pyproject.toml"
@@ -35,11 +60,12 @@ class Project:
                 f"directory {root_dir}."
             )
 
-        self._git_repo = git_repo
+        self._git = git
         self._pyenv = None
         self._poetry = None
         self._pyproject = None
         self._attr_cache = None
+        self._changes = None
 
         self.refresh()
 
@@ -69,6 +95,13 @@ class Project:
         self._attr_cache[key] = d
         return d
 
+    @property
+    def pyproject(self) -> dict:
+        """
+        The parsed pyproject.toml.
+        """
+        return self._pyproject
+
     def get_dependencies(self):
         return self.get_attribute("tool.poetry.dependencies")
 
@@ -91,6 +124,21 @@ class Project:
         except:
             raise UnknownLicenseError(license_name)
 
+    @property
+    def cache_dir(self) -> Path:
+        """
+        Directory for hon's per-project cached state.
+        """
+        return self.root_dir / CACHE_DIR
+
+    @property
+    def changes(self) -> Changes:
+        if self._changes is None:
+            self._changes = Changes(
+                self.root_dir / CHANGES_FILE, self.cache_dir / "changes.json"
+            )
+        return self._changes
+
     def init(self):
         """
         Initialize the project directory.
@@ -102,17 +150,34 @@ class Project:
         self.add_all_untracked()
 
         # Check that a compatible version of Python is available; install it if not
-        self._pyenv.ensure_python(self.get_python_version())
+        self.pyenv.ensure_python(self.get_python_version())
 
         # Create virtualenv
-        self._pyenv.create_virtualenv(self.name, self.get_python_version())
+        self.pyenv.create_virtualenv(self.name, self.get_python_version())
 
     def create_from_templates(self):
         template_dir = get_templates()
         template_dir.create(self.root_dir, {"project": self})
 
     def add_all_untracked(self):
-        self._git_repo.index.add(self._git_repo.untracked_files)
+        self.git.add(self.git.untracked_files)
+
+    def clean_candidates(
+        self, untracked: bool = False, patterns: Sequence[str] = ()
+    ) -> Iterator[Path]:
+        """
+        Yields the paths that should be deleted by `clean`, without descending into
+        ignored directories. Files tracked by git are never included.
+
+        Args:
+            untracked: Whether to include files that are not tracked by git.
+            patterns: Additional ignore patterns, in .gitignore syntax.
+        """
+        untracked_files = set(self.git.untracked_files) if untracked else None
+        return iter_clean_candidates(
+            self.root_dir, IgnoreMatcher.from_patterns(patterns), untracked_files,
+            tracked=self.git.tracked_files
+        )
 
     def refresh(self):
         self._pyproject = read_toml(self._pyproject_file)
@@ -136,14 +201,14 @@ class Project:
 
     @property
     def git(self):
-        if self._git_repo is None:
-            from git.repo.fun import is_git_dir
-            if not is_git_dir(self.root_dir):
+        if self._git is None:
+            git = Git(working_dir=self.root_dir)
+            if not git.is_repo():
                 raise InvalidProjectError(
                     f"Project directory {self.root_dir} is not a git repository"
                 )
-            self._git_repo = Repo(self.root_dir)
-        return self._git_repo
+            self._git = git
+        return self._git
 
     def build(self, install: bool = False, **kwargs):
         self.poetry.build(**kwargs)
@@ -151,20 +216,136 @@ class Project:
             self.install()
 
     @property
-    def wheel(self):
-        abi = "none"
-        platform = "any"
-        version = f"py{self.get_python_version()[0]}"
-        return self.root_dir / "dist" / \
-            f"{self.name}-{self.version}-{version}-{abi}-{platform}.whl"
+    def wheel(self) -> Path:
+        """
+        The project wheel for the current version: the one in `dist/` if there is
+        exactly one, otherwise the name poetry gives a pure-python wheel.
+        """
+        wheels = [path for path in self.dist_files if path.suffix == ".whl"]
+        if len(wheels) == 1:
+            return wheels[0]
+        # Poetry escapes the distribution name as described in PEP 427
+        name = re.sub(r"[^\w\d.]+", "_", self.name)
+        return self.root_dir / "dist" / f"{name}-{self.version}-py3-none-any.whl"
+
+    @property
+    def dist_files(self) -> List[Path]:
+        """
+        All distribution files (wheels and sdists) for the current version.
+        """
+        dist_dir = self.root_dir / "dist"
+        if not dist_dir.exists():
+            return []
+        # Wheel names are escaped (e.g. 'my_pkg' for 'my-pkg'), so names are
+        # compared in normalized form
+        name = canonicalize(self.name)
+        files = []
+        for path in dist_dir.iterdir():
+            parsed = parse_dist_filename(path.name)
+            if (
+                parsed and canonicalize(parsed[0]) == name and
+                versions_equal(parsed[1], self.version)
+            ):
+                files.append(path)
+        return sorted(files)
 
     def install(self):
-        self.pyenv.exec(["pip", "install", "--upgrade", self.wheel])
+        self.pip("install", "--upgrade", self.wheel)
+
+    def uninstall(self, *names: str):
+        """
+        Uninstalls packages from the virtualenv with a single pip call.
+
+        Args:
+            names: The packages to uninstall; defaults to the project itself.
+        """
+        self.pip("uninstall", "-y", *(names or [self.name]))
+
+    @property
+    def virtualenv(self) -> Path:
+        """
+        The project's virtualenv, which pyenv-virtualenv names after the project.
+        """
+        virtualenv = Path(self.pyenv.root) / "versions" / self.name
+        if not virtualenv.exists():
+            raise CommandError(f"Virtualenv {virtualenv} does not exist")
+        return virtualenv
+
+    def pip(self, *args: str):
+        """
+        Runs the virtualenv's own pip, so that packages are always installed into
+        (and removed from) the project virtualenv rather than the python selected
+        by the project's python constraint.
+        """
+        run_cmd([str(self.virtualenv / "bin" / "pip")] + list(args), cwd=self.root_dir)
 
-    def uninstall(self, name: Optional[str] = None):
-        if name is None:
-            name = self.name
-        self.pyenv.exec(["pip", "uninstall", "-y", name])
+    @property
+    def site_packages(self) -> Path:
+        found = sorted(self.virtualenv.glob("lib/python*/site-packages"))
+        if not found:
+            raise CommandError(f"Virtualenv {self.virtualenv} has no site-packages")
+        return found[-1]
+
+    def sync(
+        self, dev: bool = True, dry_run: bool = False,
+        wheel_cache: Path = WHEEL_CACHE
+    ) -> SyncPlan:
+        """
+        Makes the virtualenv match poetry.lock, installing, upgrading and removing
+        only the packages that differ. Installed packages are read directly from
+        site-packages, and packages are installed from a local wheel cache, which
+        is only filled for wheels it does not already have.
+
+        Args:
+            dev: Whether to include development dependencies.
+            dry_run: Only compute the changes, do not apply them.
+            wheel_cache: Directory of cached wheels, which is shared by all projects
+                and keeps a separate subdirectory for each interpreter ABI and
+                platform.
+
+        Returns:
+            The changes that were (or, with `dry_run`, would be) made.
+        """
+        environment = target_environment(self.virtualenv / "bin" / "python")
+        plan = SyncPlan.compute(
+            locked_packages(
+                self.root_dir / "poetry.lock", dev=dev, environment=environment
+            ),
+            installed_distributions(self.site_packages),
+            keep=[self.name]
+        )
+        if dry_run or plan.is_empty:
+            return plan
+        if plan.remove:
+            self.uninstall(*plan.remove)
+        requirements = plan.install + plan.upgrade
+        # Packages locked to a git repository, URL or local path are not on the
+        # index, and are installed from their source without caching
+        direct = [req for req in requirements if is_direct_reference(req)]
+        requirements = [req for req in requirements if req not in direct]
+        if direct:
+            self.pip("install", "--no-deps", *direct)
+        if requirements:
+            wheel_cache = wheel_cache_dir(wheel_cache, environment)
+            cached = cached_wheels(wheel_cache)
+            missing = []
+            for req in requirements:
+                name, version = req.split("==")
+                if not any(
+                    versions_equal(cached_version, version)
+                    for cached_version in cached.get(canonicalize(name), [])
+                ):
+                    missing.append(req)
+            if missing:
+                self.pip(
+                    "wheel", "--no-deps", "--wheel-dir", str(wheel_cache),
+                    "--find-links", str(wheel_cache), *missing
+                )
+            self.pip(
+                "install", "--no-deps", "--no-index", "--find-links", str(wheel_cache),
+                *requirements
+            )
+        return plan
 
     def add_dependency(
         self, name: Optional[str] = None, exact: bool = False, dev: bool = False,
@@ -188,17 +369,131 @@ class Project:
             self.update_dependencies()
 
     def remove_dependency(self, name: str, dev: bool = False):
-        pkg = self.poetry.remove(name, dev)
-        self.uninstall(pkg)
+        self.poetry.remove(name, dev)
         self.lock_dependencies()
+        self.sync()
 
     def update_dependencies(self, dev: bool = True):
-        self.poetry.update(dev=dev)
+        # Re-resolve into the lock file, then install only what changed
         self.lock_dependencies()
+        self.sync(dev=dev)
 
     def lock_dependencies(self):
         self.poetry.lock()
 
+    def publish(self, repository: Repository, jobs: int = 4):
+        """
+        Uploads all distribution files for the current version. Uploads that
+        succeed are recorded, so a failed publish can be re-run to upload only the
+        missing files.
+
+        Args:
+            repository: The destination repository.
+            jobs: Maximum number of concurrent uploads.
+
+        Returns:
+            A tuple (uploaded, skipped) of lists of artifacts.
+        """
+        files = self.dist_files
+        if not files:
+            raise CommandError(
+                f"No distribution files found for version {self.version}"
+            )
+        state = UploadState(
+            self.cache_dir / "uploads" / f"{urlsplit(repository.upload_url).netloc}-"
+            f"{self.version}.json"
+        )
+        return upload_artifacts(
+            (Artifact(path) for path in files), repository, self.name,
+            str(self.version), state=state, jobs=jobs
+        )
+
+    def docker_build(
+        self, docker: Docker, tag: Optional[str] = None,
+        cmd: Optional[Sequence[str]] = None, base_image: Optional[str] = None
+    ) -> CacheStats:
+        """
+        Builds a Docker image from the project wheel. If the project does not have
+        its own Dockerfile, one is generated that installs the locked dependencies
+        and the wheel in separate layers.
+
+        Args:
+            docker: The Docker wrapper.
+            tag: The image tag; defaults to `{name}:{version}`.
+            cmd: The image CMD; defaults to the first script in pyproject.toml, or
+                `python -m {name}` if the package has a __main__ module.
+            base_image: The base image; defaults to the slim python image for the
+                project's python version.
+
+        Returns:
+            Layer cache statistics for the build.
+        """
+        if tag is None:
+            tag = f"{self.name}:{self.version}"
+        dockerfile = self.root_dir / "Dockerfile"
+        if not dockerfile.exists():
+            dockerfile = self.cache_dir / "docker" / "Dockerfile"
+            if base_image is None:
+                python_version = re.search(r"\d+(\.\d+)?", self.get_python_version())
+                base_image = DEFAULT_BASE_IMAGE.format(
+                    python_version=python_version.group(0)
+                )
+            write_dockerfile(
+                self.root_dir, dockerfile,
+                requirements=Path(CACHE_DIR) / "docker" / "requirements.txt",
+                wheel=self.wheel.relative_to(self.root_dir),
+                lock_file=self.root_dir / "poetry.lock",
+                cmd=list(cmd or self._get_docker_cmd()),
+                base_image=base_image
+            )
+        return docker.build(tag, dockerfile, self.root_dir)
+
+    def _get_docker_cmd(self) -> List[str]:
+        if self.scripts:
+            return [next(iter(self.scripts))]
+        if (self.root_dir / self.name / "__main__.py").exists():
+            return ["python", "-m", self.name]
+        raise CommandError(
+            "Could not determine the Docker CMD; specify it with --cmd"
+        )
+
+    def docs(
+        self, force: bool = False, jobs: Optional[str] = "auto"
+    ) -> Optional[List[str]]:
+        """
+        Builds the HTML documentation with Sphinx. The build is skipped if the docs
+        sources, the package docstrings and the Sphinx config are unchanged since
+        the last build. The Sphinx environment and doctrees are kept in the project
+        cache, so only changed pages are re-read.
+
+        Args:
+            force: Build even if nothing has changed.
+            jobs: Number of parallel Sphinx processes, or 'auto'.
+
+        Returns:
+            The pages that were written, or None if the build was skipped.
+        """
+        docs_dir = self.root_dir / "docs"
+        output_dir = docs_dir / "_build" / "html"
+        cache_dir = self.cache_dir / "docs"
+        stamp = DocsStamp(cache_dir / "stamp.json")
+        fingerprint = stamp.compute(
+            docs_dir, self.root_dir / self.name, exclude=docs_dir / "_build"
+        )
+        if not force and fingerprint == stamp.fingerprint and output_dir.exists():
+            return None
+        cmd = sphinx_command(docs_dir, output_dir, cache_dir / "doctrees", jobs)
+        try:
+            capture = run_cmd(cmd, stdout=STREAM, cwd=self.root_dir)
+        except subprocess.CalledProcessError as err:
+            raise CommandError(
+                f"Documentation build failed; full output is in {err.output.log_path}"
+            ) from err
+        with capture:
+            pages = written_pages(capture)
+        stamp.save(fingerprint)
+        return pages
+
     def test(self, tests: Optional[Sequence[str]] = None, debug: bool = False):
         cmd = ["pytest", "--cov", "--cov-report", "term-missing"]
         if debug:
@@ -207,4 +502,33 @@ class Project:
             cmd.append("--show-capture=all")
         if tests:
             cmd.extend(tests)
-        run_cmd(cmd)
+        try:
+            run_cmd(cmd, stdout=STREAM, cwd=self.root_dir).close()
+        except subprocess.CalledProcessError as err:
+            raise CommandError(
+                f"Tests failed; full output is in {err.output.log_path}"
+            ) from err
+
+    def lint(self) -> List[str]:
+        """
+        Runs flake8 over the package and tests.
+
+        Returns:
+            The reported issues, sorted by file and then by line number.
+        """
+        cmd = ["flake8", self.name]
+        if (self.root_dir / "tests").exists():
+            cmd.append("tests")
+        try:
+            capture = run_cmd(cmd, stdout=STREAM, echo=False, cwd=self.root_dir)
+        except subprocess.CalledProcessError as err:
+            # flake8 exits with status 1 when it reports issues
+            if err.returncode != 1:
+                raise CommandError(
+                    f"flake8 failed; full output is in {err.output.log_path}"
+                ) from err
+            capture = err.output
+        with capture:
+            return sorted(
+                (line.rstrip("\n") for line in capture), key=_lint_sort_key
+            )
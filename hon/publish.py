@@ -0,0 +1,374 @@
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from configparser import ConfigParser
+import hashlib
+from html.parser import HTMLParser
+import http.client
+import json
+import os
+from pathlib import Path
+import re
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit
+from urllib.request import Request, urlopen
+import uuid
+
+from hon import CommandError
+
+
+PYPI_UPLOAD_URL = "https://upload.pypi.org/legacy/"
+PYPI_INDEX_URL = "https://pypi.org/simple/"
+# Simple index URLs of well-known repositories, by upload URL
+KNOWN_INDEX_URLS = {
+    PYPI_UPLOAD_URL: PYPI_INDEX_URL,
+    "https://test.pypi.org/legacy/": "https://test.pypi.org/simple/",
+}
+PYPIRC = Path.home() / ".pypirc"
+CHUNK_SIZE = 64 * 1024
+
+
+class Artifact:
+    """
+    A distribution file to be uploaded. The content hash is computed by streaming
+    the file, and only once.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self._sha256 = None
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    @property
+    def size(self) -> int:
+        return self.path.stat().st_size
+
+    @property
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            digest = hashlib.sha256()
+            with open(self.path, "rb") as inp:
+                for chunk in iter(lambda: inp.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            self._sha256 = digest.hexdigest()
+        return self._sha256
+
+    @property
+    def filetype(self) -> str:
+        return "bdist_wheel" if self.name.endswith(".whl") else "sdist"
+
+    @property
+    def pyversion(self) -> str:
+        if self.filetype == "bdist_wheel":
+            # {name}-{version}(-{build})?-{python}-{abi}-{platform}.whl
+            return self.name[:-4].split("-")[-3]
+        return "source"
+
+
+def parse_dist_filename(filename: str) -> Optional[Tuple[str, str]]:
+    """
+    Gets the distribution name and version from the name of a wheel
+    ('{name}-{version}(-{build})?-{python}-{abi}-{platform}.whl') or an sdist
+    ('{name}-{version}.tar.gz').
+
+    Returns:
+        A tuple (name, version), or None if `filename` is not a distribution file.
+    """
+    if filename.endswith(".whl"):
+        parts = filename[:-4].split("-")
+        if len(parts) in (5, 6):
+            return parts[0], parts[1]
+    elif filename.endswith(".tar.gz"):
+        # Versions never contain '-', but sdist names may
+        name, sep, version = filename[:-7].rpartition("-")
+        if sep:
+            return name, version
+    return None
+
+
+class UploadError(Exception):
+    """
+    Raised when the repository rejects an upload.
+
+    Args:
+        artifact: The artifact that failed to upload.
+        status: The HTTP status code.
+        reason: The HTTP reason phrase.
+    """
+    def __init__(self, artifact: Artifact, status: int, reason: str):
+        super().__init__(f"Upload of {artifact.name} failed: {status} {reason}")
+        self.status = status
+
+    @property
+    def is_transient(self) -> bool:
+        return self.status >= 500
+
+
+class _HashLinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.hashes: Set[str] = set()
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href") or ""
+            _, _, fragment = href.partition("#sha256=")
+            if fragment:
+                self.hashes.add(fragment)
+
+
+class Repository:
+    """
+    A package repository that implements the PyPI legacy upload API and the
+    simple (PEP 503) index API.
+
+    Args:
+        upload_url: URL of the upload endpoint.
+        index_url: URL of the simple index of the same repository, used to skip
+            files that were already uploaded. If None, no files are skipped.
+        username: Username for authentication.
+        password: Password or API token.
+        retries: Number of times to retry a failed upload.
+    """
+    def __init__(
+        self, upload_url: str = PYPI_UPLOAD_URL,
+        index_url: Optional[str] = PYPI_INDEX_URL,
+        username: Optional[str] = None, password: Optional[str] = None,
+        retries: int = 3
+    ):
+        self.upload_url = upload_url
+        self.index_url = index_url
+        self.username = username
+        self.password = password
+        self.retries = retries
+
+    @classmethod
+    def from_config(cls, name: str, config: Optional[dict] = None) -> "Repository":
+        """
+        Creates a Repository from a section of the hon config file, falling back to
+        the matching section of ~/.pypirc. Unless `index_url` is configured, it is
+        only known for PyPI and TestPyPI; for other repositories the remote check
+        for existing files is disabled.
+        """
+        settings = {}
+        if PYPIRC.exists():
+            pypirc = ConfigParser()
+            pypirc.read(str(PYPIRC))
+            if pypirc.has_section(name):
+                settings.update(pypirc[name])
+                if "repository" in settings:
+                    settings["upload_url"] = settings.pop("repository")
+        settings.update(config or {})
+        if "index_url" not in settings:
+            settings["index_url"] = KNOWN_INDEX_URLS.get(
+                settings.get("upload_url", PYPI_UPLOAD_URL)
+            )
+        return cls(**{
+            key: settings[key]
+            for key in ("upload_url", "index_url", "username", "password")
+            if key in settings
+        })
+
+    @property
+    def _auth_headers(self) -> Dict[str, str]:
+        if self.username is None:
+            return {}
+        credentials = f"{self.username}:{self.password or ''}".encode("utf-8")
+        return {"Authorization": f"Basic {b64encode(credentials).decode()}"}
+
+    def existing_hashes(self, project_name: str) -> Set[str]:
+        """
+        Returns the sha256 digests of all files the repository already has for a
+        project, or an empty set if the repository has no index URL.
+        """
+        if not self.index_url:
+            return set()
+        url = urljoin(self.index_url, f"{normalize_name(project_name)}/")
+        try:
+            with urlopen(Request(url, headers=self._auth_headers)) as response:
+                html = response.read().decode("utf-8")
+        except HTTPError as err:
+            if err.code == 404:
+                return set()
+            raise
+        parser = _HashLinkParser()
+        parser.feed(html)
+        return parser.hashes
+
+    def upload(self, artifact: Artifact, name: str, version: str):
+        """
+        Uploads an artifact, retrying with exponential backoff on connection errors
+        and server errors. Other rejections (e.g. 400 File already exists) are
+        raised immediately.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return self._upload(artifact, name, version)
+            except UploadError as err:
+                if not err.is_transient or attempt == self.retries:
+                    raise
+            except (OSError, http.client.HTTPException):
+                if attempt == self.retries:
+                    raise
+            time.sleep(2 ** attempt)
+
+    def _upload(self, artifact: Artifact, name: str, version: str):
+        fields = {
+            ":action": "file_upload",
+            "protocol_version": "1",
+            "metadata_version": "2.1",
+            "name": name,
+            "version": version,
+            "filetype": artifact.filetype,
+            "pyversion": artifact.pyversion,
+            "sha256_digest": artifact.sha256,
+        }
+        boundary = uuid.uuid4().hex
+        head, tail = _multipart_envelope(fields, artifact.name, boundary)
+        headers = {
+            "Content-Type": f"multipart/form-data; boundary={boundary}",
+            "Content-Length": str(len(head) + artifact.size + len(tail)),
+        }
+        headers.update(self._auth_headers)
+
+        url = urlsplit(self.upload_url)
+        conn_cls = http.client.HTTPSConnection if url.scheme == "https" \
+            else http.client.HTTPConnection
+        conn = conn_cls(url.netloc)
+        try:
+            conn.request(
+                "POST", url.path or "/", body=_stream_body(head, artifact.path, tail),
+                headers=headers
+            )
+            response = conn.getresponse()
+            response.read()
+        finally:
+            conn.close()
+        if response.status >= 400:
+            raise UploadError(artifact, response.status, response.reason)
+
+
+def _multipart_envelope(
+    fields: Dict[str, str], filename: str, boundary: str
+) -> Tuple[bytes, bytes]:
+    """
+    Returns the multipart/form-data bytes that precede and follow the file
+    content, so that the file itself can be streamed.
+    """
+    parts = []
+    for key, value in fields.items():
+        parts.append(
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{key}"\r\n\r\n'
+            f"{value}\r\n"
+        )
+    parts.append(
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="content"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    )
+    return "".join(parts).encode("utf-8"), f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+
+def _stream_body(head: bytes, path: Path, tail: bytes) -> Iterator[bytes]:
+    yield head
+    with open(path, "rb") as inp:
+        for chunk in iter(lambda: inp.read(CHUNK_SIZE), b""):
+            yield chunk
+    yield tail
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalizes a project name as described in PEP 503.
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class UploadState:
+    """
+    Record of the artifacts already uploaded for a release, so that an interrupted
+    upload can be resumed by retrying only the missing artifacts.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        if path.exists():
+            with open(path, "rt") as inp:
+                self.uploaded = set(json.load(inp))
+        else:
+            self.uploaded = set()
+
+    def add(self, sha256: str):
+        self.uploaded.add(sha256)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "wt") as out:
+            json.dump(sorted(self.uploaded), out)
+        os.replace(str(tmp_path), str(self.path))
+
+
+def upload_artifacts(
+    artifacts: Iterable[Artifact], repository: Repository, name: str, version: str,
+    state: Optional[UploadState] = None, jobs: int = 4
+) -> Tuple[List[Artifact], List[Artifact]]:
+    """
+    Uploads artifacts concurrently, skipping any the repository already has (by
+    content hash), and any recorded as uploaded in `state`.
+
+    Args:
+        artifacts: The artifacts to upload.
+        repository: The destination repository.
+        name: The project name.
+        version: The project version.
+        state: Record of previously uploaded artifacts; updated as uploads succeed.
+        jobs: Maximum number of concurrent uploads.
+
+    Returns:
+        A tuple (uploaded, skipped).
+
+    Raises:
+        CommandError if any artifact could not be uploaded; successful uploads
+        are recorded in `state`, so the command can be re-run to upload the rest.
+    """
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        # Hash in parallel while the remote index is fetched
+        artifacts = list(artifacts)
+        remote = executor.submit(repository.existing_hashes, name)
+        list(executor.map(lambda a: a.sha256, artifacts))
+        skip = remote.result()
+        if state:
+            skip |= state.uploaded
+
+        pending = {}
+        skipped = []
+        for artifact in artifacts:
+            if artifact.sha256 in skip:
+                skipped.append(artifact)
+            else:
+                # Identical files are only uploaded once
+                skip.add(artifact.sha256)
+                future = executor.submit(repository.upload, artifact, name, version)
+                pending[future] = artifact
+
+        uploaded = []
+        failed = []
+        for future in as_completed(pending):
+            artifact = pending[future]
+            try:
+                future.result()
+            except Exception as err:
+                failed.append((artifact, err))
+                continue
+            uploaded.append(artifact)
+            if state:
+                state.add(artifact.sha256)
+
+    if failed:
+        raise CommandError("\n".join(
+            [f"{len(failed)} of {len(pending)} uploads failed:"] +
+            [f"  {artifact.name}: {err}" for artifact, err in failed]
+        ))
+    return uploaded, skipped
@@ -0,0 +1,134 @@
+import re
+from typing import List, Mapping, Optional
+
+from packaging.markers import Marker
+from packaging.specifiers import SpecifierSet
+from packaging.version import InvalidVersion, Version
+
+
+CONSTRAINT_RE = re.compile(r"^(?P<op>===|==|!=|<=|>=|~=|<|>|\^|~|=)?(?P<version>\S+)$")
+
+
+def versions_equal(version1: str, version2: str) -> bool:
+    """
+    Compares two versions according to PEP 440, so versions that differ only in
+    spelling (e.g. '1.0.0-beta.1' and '1.0.0b1') are equal. Falls back to string
+    comparison for versions that cannot be parsed.
+    """
+    try:
+        return Version(version1) == Version(version2)
+    except InvalidVersion:
+        return version1 == version2
+
+
+def _upper_bound(op: str, version: str) -> str:
+    """
+    Returns the exclusive upper bound of a caret or tilde constraint.
+    """
+    release = Version(version).release
+    if op == "^":
+        # Bump the first non-zero component; ^0.2 means <0.3
+        index = 0
+        while index < len(release) - 1 and release[index] == 0:
+            index += 1
+    else:
+        index = 1 if len(release) > 1 else 0
+    return ".".join(str(part) for part in release[:index] + (release[index] + 1,))
+
+
+def constraint_specifiers(constraint: str) -> List[SpecifierSet]:
+    """
+    Translates a poetry version constraint (e.g. '^3.6', '>=2.7,!=3.0.*',
+    '~2.7 || ^3.5') into PEP 440 specifier sets.
+
+    Returns:
+        A list of alternatives, any of which may match. An empty list allows any
+        version.
+    """
+    alternatives = []
+    for alternative in constraint.split("||"):
+        alternative = re.sub(r"(===|==|!=|<=|>=|~=|<|>|\^|~|=)\s+", r"\1", alternative)
+        specifiers = []
+        for part in re.split(r"[\s,]+", alternative.strip()):
+            if part in ("", "*"):
+                continue
+            match = CONSTRAINT_RE.match(part)
+            if not match:
+                raise ValueError(f"Invalid version constraint: {constraint}")
+            op, version = match.group("op") or "==", match.group("version")
+            if op in ("^", "~"):
+                specifiers.extend([f">={version}", f"<{_upper_bound(op, version)}"])
+            else:
+                specifiers.append(f"{'==' if op == '=' else op}{version}")
+        if not specifiers:
+            return []
+        alternatives.append(SpecifierSet(",".join(specifiers)))
+    return alternatives
+
+
+def constraint_marker(
+    constraint: str, variable: str = "python_full_version"
+) -> Optional[str]:
+    """
+    Translates a poetry version constraint into a PEP 508 marker on `variable`.
+
+    Returns:
+        The marker, or None if the constraint allows any version.
+    """
+    alternatives = [
+        " and ".join(
+            f'{variable} {spec.operator} "{spec.version}"'
+            # Specifier sets are unordered; lower bounds are listed first
+            for spec in sorted(
+                specifiers, key=lambda spec: (spec.operator[0] != ">", str(spec))
+            )
+        )
+        for specifiers in constraint_specifiers(constraint)
+    ]
+    if not alternatives:
+        return None
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return " or ".join(f"({alternative})" for alternative in alternatives)
+
+
+def package_marker(package: Mapping) -> Optional[str]:
+    """
+    Combines the conditions under which a poetry.lock package is installed - its
+    marker, the python and platform of the legacy requirements table, and its
+    python-versions - into a single PEP 508 marker.
+
+    Returns:
+        The marker, or None if the package is installed in every environment.
+    """
+    requirements = package.get("requirements", {})
+    markers = [
+        constraint_marker(package.get("python-versions", "*")),
+        constraint_marker(requirements.get("python", "*")),
+        package.get("marker")
+    ]
+    if requirements.get("platform"):
+        markers.append(f'sys_platform == "{requirements["platform"]}"')
+    markers = [marker for marker in markers if marker]
+    if not markers:
+        return None
+    if len(markers) == 1:
+        return markers[0]
+    return " and ".join(f"({marker})" for marker in markers)
+
+
+def evaluate_marker(marker: Optional[str], environment: Mapping[str, str]) -> bool:
+    """
+    Evaluates a PEP 508 environment marker.
+
+    Args:
+        marker: The marker; None is always true.
+        environment: Values of the marker variables, e.g. from
+            :func:`hon.sync.target_environment`. 'extra' is empty unless given.
+
+    Raises:
+        packaging.markers.InvalidMarker if the marker cannot be parsed.
+    """
+    if not marker:
+        return True
+    return Marker(marker).evaluate(dict({"extra": ""}, **environment))
@@ -0,0 +1,238 @@
+import json
+from pathlib import Path
+import re
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from hon.config import DEFAULT_PATH
+from hon.requirements import evaluate_marker, package_marker, versions_equal
+from hon.utils import read_toml, run_cmd
+
+
+WHEEL_CACHE = DEFAULT_PATH / "wheels"
+DIST_INFO_RE = re.compile(r"^(?P<name>.+?)-(?P<version>[^-]+)\.dist-info$")
+# Eggs escape '-' in names and versions, and may end with the python version
+EGG_INFO_RE = re.compile(
+    r"^(?P<name>[^-]+)-(?P<version>[^-]+)(?:-py\d+(?:\.\d+)*)?\.egg-info$"
+)
+PROTECTED = {"pip", "setuptools", "wheel", "distribute", "pkg-resources"}
+# Prints the PEP 508 marker variables of the python that runs it, plus a
+# 'wheel_tag' identifying the wheels it can install
+ENVIRONMENT_SCRIPT = """
+import json, os, platform, sys, sysconfig
+impl = sys.implementation
+version = "{0.major}.{0.minor}.{0.micro}".format(impl.version)
+if impl.version.releaselevel != "final":
+    version += impl.version.releaselevel[0] + str(impl.version.serial)
+print(json.dumps({
+    "implementation_name": impl.name,
+    "implementation_version": version,
+    "os_name": os.name,
+    "platform_machine": platform.machine(),
+    "platform_python_implementation": platform.python_implementation(),
+    "platform_release": platform.release(),
+    "platform_system": platform.system(),
+    "platform_version": platform.version(),
+    "python_full_version": platform.python_version(),
+    "python_version": ".".join(platform.python_version_tuple()[:2]),
+    "sys_platform": sys.platform,
+    "wheel_tag": "{}-{}".format(
+        sysconfig.get_config_var("SOABI") or impl.cache_tag,
+        sysconfig.get_platform()
+    ),
+}))
+"""
+
+
+def canonicalize(name: str) -> str:
+    """
+    Normalizes a distribution name as described in PEP 503.
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def target_environment(python: Path) -> Dict[str, str]:
+    """
+    Gets the values of the PEP 508 marker variables for a python interpreter.
+    """
+    return json.loads(run_cmd([str(python), "-c", ENVIRONMENT_SCRIPT], stdout=True))
+
+
+def locked_packages(
+    lock_file: Path, dev: bool = True, environment: Optional[Mapping[str, str]] = None
+) -> Dict[str, Tuple[str, str, str]]:
+    """
+    Reads the pinned packages from poetry.lock.
+
+    Args:
+        lock_file: Path to poetry.lock.
+        dev: Whether to include development dependencies.
+        environment: Marker variables of the target environment. If given,
+            packages whose markers or python-versions exclude the environment
+            (e.g. pywin32 on linux) are skipped.
+
+    Returns:
+        Dict mapping canonical name to (name, version, requirement), where the
+        requirement is what pip installs (see :func:`lock_requirement`).
+    """
+    lock = read_toml(lock_file)
+    return {
+        canonicalize(pkg["name"]): (
+            pkg["name"], pkg["version"], lock_requirement(pkg, lock_file.parent)
+        )
+        for pkg in lock.get("package", [])
+        if (dev or pkg.get("category", "main") == "main") and (
+            environment is None or evaluate_marker(package_marker(pkg), environment)
+        )
+    }
+
+
+def lock_requirement(package: Mapping, root_dir: Path) -> str:
+    """
+    Returns the requirement that installs a poetry.lock package: 'name==version'
+    for packages from an index, or a PEP 508 direct reference
+    ('name @ git+https://...@rev') for packages locked to a git repository, a URL,
+    or a local directory or file.
+
+    Args:
+        package: The package table from poetry.lock.
+        root_dir: The project directory, to which local paths are relative.
+    """
+    name = package["name"]
+    source = package.get("source", {})
+    kind = source.get("type")
+    if kind == "git":
+        ref = source.get("resolved_reference") or source.get("reference")
+        return f"{name} @ git+{source['url']}" + (f"@{ref}" if ref else "")
+    if kind == "url":
+        return f"{name} @ {source['url']}"
+    if kind in ("directory", "file"):
+        return f"{name} @ {(root_dir / source['url']).resolve().as_uri()}"
+    return f"{name}=={package['version']}"
+
+
+def is_direct_reference(requirement: str) -> bool:
+    return " @ " in requirement
+
+
+def installed_distributions(site_packages: Path) -> Dict[str, Tuple[str, str]]:
+    """
+    Lists the distributions installed in a site-packages directory. Names and
+    versions are taken from the `.dist-info` and `.egg-info` names, falling back
+    to the metadata file only when the name cannot be parsed.
+
+    Returns:
+        Dict mapping canonical name to (name, version).
+    """
+    installed = {}
+    if not site_packages.exists():
+        return installed
+    for entry in site_packages.iterdir():
+        if entry.name.endswith(".dist-info"):
+            match = DIST_INFO_RE.match(entry.name)
+            metadata = entry / "METADATA"
+        elif entry.name.endswith(".egg-info"):
+            match = EGG_INFO_RE.match(entry.name)
+            # Either a directory or the PKG-INFO file itself
+            metadata = entry / "PKG-INFO" if entry.is_dir() else entry
+        else:
+            continue
+        if match:
+            name, version = match.group("name"), match.group("version")
+        else:
+            name, version = _read_metadata(metadata)
+        if name:
+            installed[canonicalize(name)] = (name, version)
+    return installed
+
+
+def _read_metadata(path: Path) -> Tuple[Optional[str], Optional[str]]:
+    name = version = None
+    if path.exists():
+        with open(path, "rt", encoding="utf-8", errors="replace") as inp:
+            for line in inp:
+                if not line.strip():
+                    # End of the headers
+                    break
+                key, _, value = line.partition(":")
+                if key == "Name":
+                    name = value.strip()
+                elif key == "Version":
+                    version = value.strip()
+    return name, version
+
+
+class SyncPlan:
+    """
+    The changes needed to make a virtualenv match a lock file.
+
+    Args:
+        install: Requirements (see :func:`lock_requirement`) for packages to
+            install.
+        upgrade: Requirements for installed packages whose version differs.
+        remove: Names of installed packages that are not in the lock file.
+    """
+    def __init__(self, install: List[str], upgrade: List[str], remove: List[str]):
+        self.install = install
+        self.upgrade = upgrade
+        self.remove = remove
+
+    @classmethod
+    def compute(
+        cls, locked: Dict[str, Tuple[str, str, str]],
+        installed: Dict[str, Tuple[str, str]], keep: Iterable[str] = ()
+    ) -> "SyncPlan":
+        """
+        Args:
+            locked: Packages in the lock file.
+            installed: Packages in the virtualenv.
+            keep: Names of additional packages that must never be removed, e.g.
+                the project itself.
+        """
+        keep = PROTECTED | set(canonicalize(name) for name in keep)
+        install = []
+        upgrade = []
+        for key, (_, version, requirement) in sorted(locked.items()):
+            if key not in installed:
+                install.append(requirement)
+            elif not versions_equal(installed[key][1], version):
+                upgrade.append(requirement)
+        remove = sorted(
+            name for key, (name, _) in installed.items()
+            if key not in locked and key not in keep
+        )
+        return cls(install, upgrade, remove)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.install or self.upgrade or self.remove)
+
+    def describe(self) -> str:
+        if self.is_empty:
+            return "Virtualenv is in sync with poetry.lock"
+        lines = []
+        lines.extend(f"+ {req}" for req in self.install)
+        lines.extend(f"^ {req}" for req in self.upgrade)
+        lines.extend(f"- {name}" for name in self.remove)
+        return "\n".join(lines)
+
+
+def wheel_cache_dir(cache_dir: Path, environment: Mapping[str, str]) -> Path:
+    """
+    Returns the directory within a wheel cache for the interpreter described by
+    `environment` (see :func:`target_environment`). Wheels are only shared by
+    interpreters with the same ABI and platform, so a wheel built for one is never
+    treated as cached for another.
+    """
+    return cache_dir / re.sub(r"[^\w.-]+", "_", environment["wheel_tag"])
+
+
+def cached_wheels(cache_dir: Path) -> Dict[str, List[str]]:
+    """
+    Lists the versions of each distribution in a wheel cache.
+    """
+    wheels: Dict[str, List[str]] = {}
+    if cache_dir.exists():
+        for wheel in cache_dir.glob("*.whl"):
+            name, version = wheel.name.split("-")[:2]
+            wheels.setdefault(canonicalize(name), []).append(version)
+    return wheels
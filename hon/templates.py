@@ -1,6 +1,8 @@
 from pathlib import Path
 import pkg_resources
 
+from hon.profiling import profile
+
 
 TEMPLATES = None
 
@@ -16,6 +18,7 @@ class TemplateDir:
     def add_subdir(self, dirname: str, subdir: "TemplateDir"):
         self.subdirs[dirname] = subdir
 
+    @profile("render templates")
     def create(self, parent_dir: Path, values: dict):
         for filename, template in self.templates.items():
             resolved_filename = filename.format(**values)
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import subprocess
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from hon import CommandError
+from hon.requirements import package_marker
+from hon.utils import STREAM, read_toml, run_cmd
+
+
+DEFAULT_BASE_IMAGE = "python:{python_version}-slim"
+DOCKERFILE_TEMPLATE = """# syntax=docker/dockerfile:1
+# Generated by hon. Layers are ordered from least to most frequently changed so
+# that a source-only change reuses every dependency layer.
+FROM {base_image}
+
+# Dependencies, pinned from poetry.lock ({lock_hash})
+COPY {requirements} /tmp/requirements.txt
+RUN --mount=type=cache,target=/root/.cache/pip \\
+    pip install -r /tmp/requirements.txt
+
+# The project itself
+COPY {wheel} /tmp/
+RUN --mount=type=cache,target=/root/.cache/pip \\
+    pip install --no-deps /tmp/{wheel_name}
+
+CMD {cmd}
+"""
+STEP_RE = re.compile(r"^#(\d+) \[(?:[\w-]+ )?\d+/\d+\] ")
+CACHED_RE = re.compile(r"^#(\d+) CACHED")
+
+
+def lock_hash(lock_file: Path) -> str:
+    with open(lock_file, "rb") as inp:
+        return hashlib.sha256(inp.read()).hexdigest()[:16]
+
+
+def lock_requirements(lock_file: Path) -> List[str]:
+    """
+    Returns pinned requirements for the non-development packages in poetry.lock.
+    Each package's marker and python-versions are kept as a PEP 508 marker, so
+    that pip skips packages that do not apply to the image's platform or python.
+    """
+    lock = read_toml(lock_file)
+    requirements = []
+    for pkg in lock.get("package", []):
+        if pkg.get("category", "main") != "main":
+            continue
+        requirement = f"{pkg['name']}=={pkg['version']}"
+        marker = package_marker(pkg)
+        if marker:
+            requirement = f"{requirement} ; {marker}"
+        requirements.append(requirement)
+    return sorted(requirements)
+
+
+class CacheStats:
+    """
+    Layer cache hits and misses parsed from BuildKit's plain progress output.
+    """
+    def __init__(self, steps: Dict[str, str], cached: Sequence[str]):
+        self.steps = steps
+        self.cached = set(cached) & set(steps)
+
+    @classmethod
+    def parse(cls, lines: Iterable[str]) -> "CacheStats":
+        steps = {}
+        cached = []
+        for line in lines:
+            line = line.rstrip("\n")
+            step = STEP_RE.match(line)
+            if step:
+                description = line[step.end():].strip()
+                # Pulling the base image is reported as DONE even when it is
+                # cached, and is not a layer of the Dockerfile
+                if not description.startswith("FROM "):
+                    steps.setdefault(step.group(1), description)
+            elif CACHED_RE.match(line):
+                cached.append(CACHED_RE.match(line).group(1))
+        return cls(steps, cached)
+
+    @property
+    def hits(self) -> int:
+        return len(self.cached)
+
+    @property
+    def misses(self) -> int:
+        return len(self.steps) - self.hits
+
+    def report(self) -> str:
+        lines = [f"Layer cache: {self.hits} hit(s), {self.misses} miss(es)"]
+        for step_id in sorted(self.steps, key=int):
+            status = "CACHED" if step_id in self.cached else "BUILT "
+            lines.append(f"  {status} {self.steps[step_id]}")
+        return "\n".join(lines)
+
+
+class Docker:
+    def __init__(
+        self, executable: Optional[str] = "docker", working_dir: Optional[Path] = None
+    ):
+        self._executable = executable
+        self.working_dir = working_dir or Path.cwd()
+
+    def build(
+        self, tag: str, dockerfile: Path, context: Optional[Path] = None
+    ) -> CacheStats:
+        """
+        Builds an image with BuildKit and returns the layer cache statistics. The
+        build log is shown as it is written, and parsed from the capture afterwards.
+        """
+        try:
+            capture = run_cmd(
+                [
+                    self._executable, "build", "--progress=plain", "-t", tag,
+                    "-f", str(dockerfile), str(context or self.working_dir)
+                ],
+                stdout=STREAM, stderr=subprocess.STDOUT, cwd=self.working_dir,
+                env=dict(os.environ, DOCKER_BUILDKIT="1")
+            )
+        except subprocess.CalledProcessError as err:
+            raise CommandError(
+                f"docker build failed; full output is in {err.output.log_path}"
+            ) from err
+        with capture:
+            return CacheStats.parse(capture)
+
+    def push(self, tag: str):
+        run_cmd([self._executable, "push", tag], cwd=self.working_dir)
+
+
+def write_dockerfile(
+    context: Path, dockerfile: Path, requirements: Path, wheel: Path,
+    lock_file: Path, cmd: List[str], base_image: str
+):
+    """
+    Generates a Dockerfile, and the requirements file it installs, for a project
+    wheel.
+
+    Args:
+        context: The build context directory.
+        dockerfile: Path of the Dockerfile to write.
+        requirements: Path of the requirements file, relative to `context`.
+        wheel: Path of the project wheel, relative to `context`.
+        lock_file: Path to poetry.lock.
+        cmd: The image CMD.
+        base_image: The base image.
+    """
+    digest = lock_hash(lock_file)
+    content = "\n".join(
+        [f"# poetry.lock sha256: {digest}"] + lock_requirements(lock_file)
+    ) + "\n"
+    requirements_file = context / requirements
+    requirements_file.parent.mkdir(parents=True, exist_ok=True)
+    if not requirements_file.exists() or requirements_file.read_text() != content:
+        requirements_file.write_text(content)
+    dockerfile.parent.mkdir(parents=True, exist_ok=True)
+    with open(dockerfile, "wt") as out:
+        out.write(DOCKERFILE_TEMPLATE.format(
+            base_image=base_image,
+            lock_hash=digest,
+            requirements=requirements.as_posix(),
+            wheel=wheel.as_posix(),
+            wheel_name=wheel.name,
+            cmd=json.dumps(cmd)
+        ))
@@ -0,0 +1,220 @@
+import os
+from pathlib import Path
+import subprocess
+from typing import Iterable, List, Optional, Tuple
+
+from hon.profiling import profiled
+from hon.utils import run_cmd
+
+
+class FileStatus:
+    """
+    Status of a single path, as reported by `git status --porcelain=v2`.
+
+    Args:
+        path: Path relative to the repository root.
+        index: Status code of the path in the index (the 'X' of 'XY').
+        worktree: Status code of the path in the working tree (the 'Y' of 'XY').
+        orig_path: For renames and copies, the path in HEAD.
+    """
+    def __init__(
+        self, path: str, index: str = ".", worktree: str = ".",
+        orig_path: Optional[str] = None
+    ):
+        self.path = path
+        self.index = index
+        self.worktree = worktree
+        self.orig_path = orig_path
+
+    @property
+    def is_untracked(self) -> bool:
+        return self.index == "?"
+
+    @property
+    def is_ignored(self) -> bool:
+        return self.index == "!"
+
+    @property
+    def is_staged(self) -> bool:
+        return self.index not in ".?!"
+
+    @property
+    def is_modified(self) -> bool:
+        return self.worktree not in ".?!"
+
+    def __repr__(self):
+        return f"FileStatus({self.path!r}, {self.index}{self.worktree})"
+
+
+def parse_status(output: bytes) -> List[FileStatus]:
+    """
+    Parses the output of `git status --porcelain=v2 -z`.
+    """
+    entries = output.decode("utf-8", "surrogateescape").split("\0")
+    statuses = []
+    i = 0
+    while i < len(entries):
+        entry = entries[i]
+        i += 1
+        if not entry or entry[0] == "#":
+            continue
+        kind = entry[0]
+        if kind in "?!":
+            statuses.append(FileStatus(entry[2:], kind, kind))
+        elif kind == "1":
+            fields = entry.split(" ", 8)
+            statuses.append(FileStatus(fields[8], fields[1][0], fields[1][1]))
+        elif kind == "2":
+            # Renames and copies are followed by a separate entry for the orig path
+            fields = entry.split(" ", 9)
+            statuses.append(FileStatus(
+                fields[9], fields[1][0], fields[1][1], orig_path=entries[i]
+            ))
+            i += 1
+        elif kind == "u":
+            fields = entry.split(" ", 10)
+            statuses.append(FileStatus(fields[10], fields[1][0], fields[1][1]))
+        else:
+            raise ValueError(f"Unexpected git status entry: {entry}")
+    return statuses
+
+
+class CatFile:
+    """
+    A long-lived `git cat-file --batch` process for reading objects without
+    spawning a process per read.
+    """
+    def __init__(self, executable: str, working_dir: Path):
+        self._proc = subprocess.Popen(
+            [executable, "cat-file", "--batch"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=str(working_dir)
+        )
+
+    def read(self, rev: str) -> Tuple[str, bytes]:
+        """
+        Reads an object.
+
+        Args:
+            rev: Any revision specifier understood by git, e.g. 'HEAD:README.md'.
+
+        Returns:
+            A tuple (object_type, content).
+
+        Raises:
+            KeyError if the object does not exist.
+        """
+        self._proc.stdin.write(rev.encode("utf-8", "surrogateescape") + b"\n")
+        self._proc.stdin.flush()
+        # Missing objects are reported as '<rev> missing', where the rev may
+        # itself contain spaces
+        header = self._proc.stdout.readline().decode("utf-8", "surrogateescape")
+        fields = header.rstrip("\n").rsplit(" ", 2)
+        if len(fields) != 3 or fields[-1] in ("missing", "ambiguous"):
+            raise KeyError(f"Object {rev} not found in git repository")
+        _, obj_type, size = fields
+        content = self._proc.stdout.read(int(size))
+        # Each object is followed by a newline
+        self._proc.stdout.read(1)
+        return obj_type, content
+
+    def close(self):
+        if self._proc.poll() is None:
+            self._proc.stdin.close()
+            self._proc.wait()
+
+
+class Git:
+    """
+    Thin wrapper around the git executable. All status information is obtained
+    from a single `git status` call, and objects are read through a persistent
+    `git cat-file` process.
+    """
+    def __init__(
+        self, executable: Optional[str] = "git", working_dir: Optional[Path] = None
+    ):
+        self._executable = executable
+        self.working_dir = working_dir or Path.cwd()
+        self._cat_file = None
+
+    @classmethod
+    def init(cls, working_dir: Path, executable: Optional[str] = "git") -> "Git":
+        git = cls(executable, working_dir)
+        git._run_command("init", "--quiet")
+        return git
+
+    def is_repo(self) -> bool:
+        try:
+            self._run_command("rev-parse", "--git-dir", stderr=subprocess.DEVNULL)
+            return True
+        except subprocess.CalledProcessError:
+            return False
+
+    def status(
+        self, untracked: bool = True, ignored: bool = False
+    ) -> List[FileStatus]:
+        """
+        Gets the status of every changed, untracked, and (optionally) ignored path.
+
+        Args:
+            untracked: Whether to include untracked files.
+            ignored: Whether to include ignored files.
+        """
+        args = [
+            "status", "--porcelain=v2", "-z",
+            f"--untracked-files={'all' if untracked else 'no'}"
+        ]
+        if ignored:
+            args.append("--ignored=matching")
+        return parse_status(self._run_command(*args))
+
+    @property
+    def untracked_files(self) -> List[str]:
+        return [s.path for s in self.status() if s.is_untracked]
+
+    @property
+    def tracked_files(self) -> List[str]:
+        """
+        Paths of all files in the index, relative to the repository root.
+        """
+        output = self._run_command("ls-files", "-z")
+        return [
+            path for path in output.decode("utf-8", "surrogateescape").split("\0")
+            if path
+        ]
+
+    def add(self, paths: Iterable[str]):
+        """
+        Stages files using a single `git update-index` call. Paths are passed on
+        stdin, so there is no limit on the number of paths. Unlike pathspecs given
+        to `git add`, which are each matched against every file (quadratic in the
+        number of paths), paths are taken literally, so names starting with ':' or
+        containing glob characters are also handled correctly.
+
+        Args:
+            paths: Paths of files (not directories), relative to the working
+                directory. Files that no longer exist are removed from the index.
+        """
+        stdin = b"\0".join(os.fsencode(path) for path in paths)
+        if stdin:
+            self._run_command(
+                "update-index", "--add", "--remove", "-z", "--stdin", input=stdin
+            )
+
+    def read_object(self, rev: str) -> Tuple[str, bytes]:
+        """
+        Reads an object from the repository. See :meth:`CatFile.read`.
+        """
+        if self._cat_file is None:
+            self._cat_file = CatFile(self._executable, self.working_dir)
+        return self._cat_file.read(rev)
+
+    def close(self):
+        if self._cat_file is not None:
+            self._cat_file.close()
+            self._cat_file = None
+
+    def _run_command(self, *args, **kwargs) -> bytes:
+        cmd = [self._executable]
+        cmd.extend(args)
+        with profiled(f"git {args[0]}", "git"):
+            return run_cmd(cmd, stdout=True, cwd=self.working_dir, **kwargs)
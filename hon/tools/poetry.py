@@ -1,7 +1,10 @@
 from pathlib import Path
+import subprocess
 from typing import Optional
 
-from hon.utils import run_cmd
+from hon import CommandError
+from hon.profiling import profiled
+from hon.utils import STREAM, run_cmd
 
 
 class Poetry:
@@ -53,7 +56,18 @@ class Poetry:
     def _run_command(self, *args, **kwargs):
         cmd = self._get_command(**kwargs)
         cmd.extend(args)
-        run_cmd(cmd, cwd=self.working_dir)
+        with profiled(f"poetry {args[0]}", "poetry"):
+            if not kwargs.get("debug"):
+                run_cmd(cmd, cwd=self.working_dir)
+                return
+            # Verbose output can be very large, so only keep the tail in memory.
+            # Interactive commands are not streamed, as prompts are not line-based.
+            try:
+                run_cmd(cmd, stdout=STREAM, cwd=self.working_dir).close()
+            except subprocess.CalledProcessError as err:
+                raise CommandError(
+                    f"poetry {args[0]} failed; full output is in {err.output.log_path}"
+                ) from err
 
     def _get_command(self, debug: bool = False):
         cmd = [self._executable]
@@ -1,5 +1,7 @@
+import os
 from typing import Optional
 
+from hon.profiling import profiled
 from hon.tools.setup import PyenvVersion as PyenvBase
 from hon.utils import run_cmd
 
@@ -14,8 +16,9 @@ class Pyenv(PyenvBase):
         run_cmd(cmd, cwd=self.cwd)
 
     def exec(self, cmd):
-        run_cmd(
-            [self.executable, "exec"] + cmd,
-            env={"PYENV_VERSION": str(self.python_version)},
-            cwd=self.cwd
-        )
+        with profiled(f"pyenv exec {cmd[0]}", "pyenv"):
+            run_cmd(
+                [self.executable, "exec"] + cmd,
+                env=dict(os.environ, PYENV_VERSION=str(self.python_version)),
+                cwd=self.cwd
+            )
@@ -11,6 +11,8 @@ import os
 import re
 import subprocess
 import sys
+import threading
+import time
 
 
 # Version Parsing
@@ -52,15 +54,39 @@ class PythonVersion:
     def bump(self, which, keep_prerelease=False):
         newver, is_prerelease = self.as_tuple()
         if which == "major":
-            newver[0] += 1
+            newver = [newver[0] + 1, 0, 0]
         elif which == "minor":
-            newver[1] += 1
+            newver = [newver[0], newver[1] + 1, 0]
         else:
             newver[2] += 1
         if not keep_prerelease:
             is_prerelease = False
         return PythonVersion(*newver, is_prerelease)
 
+    def _key(self):
+        return self.major, self.minor, self.patch, not self.is_prerelease
+
+    def __eq__(self, other):
+        return self._key() == other._key()
+
+    def __ne__(self, other):
+        return self._key() != other._key()
+
+    def __lt__(self, other):
+        return self._key() < other._key()
+
+    def __le__(self, other):
+        return self._key() <= other._key()
+
+    def __gt__(self, other):
+        return self._key() > other._key()
+
+    def __ge__(self, other):
+        return self._key() >= other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
     def as_tuple(self):
         return [self.major, self.minor, self.patch], self.is_prerelease
 
@@ -83,6 +109,12 @@ def run(cmd, echo=True, **kwargs):
     return subprocess.run(cmd, **kwargs)
 
 
+def capture(cmd, **kwargs):
+    return run(
+        cmd, echo=False, stdout=subprocess.PIPE, universal_newlines=True, **kwargs
+    ).stdout
+
+
 def run_pipe(cmd, pipe_cmd, cwd=None, pipe_env=None):
     proc1 = subprocess.Popen(cmd, stdout=subprocess.PIPE, cwd=cwd)
     proc2 = subprocess.Popen(
@@ -134,13 +166,13 @@ def get_installed_python_versions(prerelease=None):
             PythonVersion.parse(
                 VERSION_RE.match(version).group(1), prerelease is not False
             )
-            for version in run(["pyenv", "versions"]).stdout.splitlines()
+            for version in capture(["pyenv", "versions"]).splitlines()
         )
     ))
 
 
 def get_available_python_versions(prerelease):
-    lines = run(["pyenv", "install", "--list"]).stdout.splitlines()
+    lines = capture(["pyenv", "install", "--list"]).splitlines()
     assert lines[0] == "Available versions:"
     return list(filter(
         None, (PythonVersion.parse(v.strip(), prerelease is True) for v in lines[1:])
@@ -159,7 +191,8 @@ def select_python_version(constraints, versions):
 class Pyenv:
     def __init__(self, executable=None, root_dir=None, working_dir=None):
         self.executable = str(executable) if executable else "pyenv"
-        self.root = root_dir or os.path.expanduser("~/.pyenv")
+        self.root = root_dir or os.environ.get("PYENV_ROOT") or \
+            os.path.expanduser("~/.pyenv")
         self.cwd = str(working_dir or os.getcwd())
 
     @classmethod
@@ -253,20 +286,184 @@ def is_installed(cmd):
 def get_dependency(name, constraint="*"):
     if constraint == "*":
         return name
-    else:
-        return "{}{}".format(name, constraint)
+    # Translate poetry-style caret and tilde constraints, which pip does not accept
+    if constraint[0] in "^~":
+        version = PythonVersion.parse(constraint[1:])
+        num_parts = len(constraint[1:].split("."))
+        given = [version.major, version.minor, version.patch][:num_parts]
+        if constraint[0] == "^":
+            # The left-most non-zero component is fixed, so ^0.4 means <0.5
+            which = len(given) - 1
+            for i, part in enumerate(given):
+                if part != 0:
+                    which = i
+                    break
+        else:
+            which = 1 if len(given) > 1 else 0
+        upper = version.bump(("major", "minor", "patch")[which])
+        constraint = ">={},<{}".format(version, upper)
+    return "{}{}".format(name, constraint)
+
 
+def iter_tools(tools):
+    for name, constraints in tools.items():
+        deps = None
+        if isinstance(constraints, tuple):
+            constraints, deps = constraints
+        yield name, constraints, deps
+
+
+def wheelhouse_env(wheelhouse):
+    """
+    Returns an environment in which pip (including the pip run by pipsi) installs
+    only from `wheelhouse`, without accessing the network.
+    """
+    env = dict(os.environ)
+    if wheelhouse:
+        env["PIP_NO_INDEX"] = "1"
+        env["PIP_FIND_LINKS"] = os.path.abspath(wheelhouse)
+    return env
+
+
+class InstallError(Exception):
+    def __init__(self, name, output):
+        super(InstallError, self).__init__("Failed to install {}".format(name))
+        self.name = name
+        self.output = output
+
+
+def install_tool(name, constraints, deps=None, python=None, wheelhouse=None, echo=True):
+    """
+    Installs a tool into its own virtualenv using pipsi, then installs any extra
+    packages into that virtualenv with a single pip call.
+
+    Returns:
+        A tuple (elapsed_seconds, output). Output is only captured if `echo` is
+        False.
+    """
+    start = time.time()
+    kwargs = dict(echo=echo, env=wheelhouse_env(wheelhouse))
+    if not echo:
+        kwargs.update(
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True
+        )
+    output = []
+
+    def run_checked(cmd):
+        proc = run(cmd, **kwargs)
+        if proc.stdout:
+            output.append(proc.stdout)
+        if proc.returncode != 0:
+            raise InstallError(name, "".join(output))
 
-def install_tool(name, constraints, deps=None, python=None):
     cmd = ["pipsi", "install"]
     if python:
         cmd.extend(["--python", python])
     cmd.append(get_dependency(name, constraints))
-    run(cmd)
+    run_checked(cmd)
     if deps:
-        pip = os.path.join(os.path.expanduser("~.local"), "venvs", name, "bin", "pip")
-        for pkg, pkg_constraint in deps.items():
-            run([pip, "install", get_dependency(pkg, pkg_constraint)])
+        pip = os.path.join(os.path.expanduser("~/.local"), "venvs", name, "bin", "pip")
+        run_checked([pip, "install"] + [
+            get_dependency(pkg, pkg_constraint) for pkg, pkg_constraint in deps.items()
+        ])
+    return time.time() - start, "".join(output)
+
+
+def install_tools(tools, python=None, jobs=1, wheelhouse=None):
+    """
+    Installs tools, up to `jobs` at a time. Each tool has its own virtualenv, so
+    installs are independent. When installing concurrently, each tool's output is
+    captured and only shown if the install fails.
+
+    Returns:
+        A list of (name, elapsed_seconds, error) tuples, in the order of `tools`.
+    """
+    pending = list(iter_tools(tools))
+    results = {}
+    lock = threading.Lock()
+    echo = jobs <= 1
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                name, constraints, deps = pending.pop(0)
+            start = time.time()
+            try:
+                elapsed, _ = install_tool(
+                    name, constraints, deps, python, wheelhouse, echo
+                )
+                error = None
+            except InstallError as err:
+                elapsed = time.time() - start
+                error = err
+                if not echo:
+                    with lock:
+                        sys.stderr.write(err.output)
+            with lock:
+                results[name] = (elapsed, error)
+
+    threads = [threading.Thread(target=worker) for _ in range(max(jobs, 1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [(name,) + results[name] for name in tools if name in results]
+
+
+def download_wheelhouse(tools, wheelhouse, python):
+    """
+    Builds wheels for each tool, its dependencies, and its extra packages into
+    `wheelhouse`, for later offline installation with --wheelhouse. `python` must
+    be the interpreter the tools will be installed with, so that binary wheels
+    match it.
+
+    Each tool is resolved separately, as it is when installed into its own
+    virtualenv, so tools that pin different versions of a shared dependency each
+    get the version they need.
+
+    Returns:
+        The names of the tools whose wheels could not be built.
+    """
+    failed = []
+    for name, constraints, deps in iter_tools(tools):
+        requirements = [get_dependency(name, constraints)]
+        for pkg, pkg_constraint in (deps or {}).items():
+            requirements.append(get_dependency(pkg, pkg_constraint))
+        cmd = [python, "-m", "pip", "wheel", "-w", wheelhouse] + requirements
+        if run(cmd).returncode != 0:
+            failed.append(name)
+    return failed
+
+
+def print_timings(results):
+    total = 0
+    sys.stdout.write("\nTool installation times:\n")
+    for name, elapsed, error in sorted(results, key=lambda r: r[1], reverse=True):
+        total += elapsed
+        status = "FAILED" if error else "ok"
+        sys.stdout.write("  {:<12} {:>8.1f}s  {}\n".format(name, elapsed, status))
+    sys.stdout.write("  {:<12} {:>8.1f}s  (sum of tool times)\n".format("total", total))
+
+
+def ensure_pyenv(prerelease):
+    """
+    Installs pyenv, pyenv-virtualenv and a compatible python, as needed.
+    """
+    # Ensure pyenv is installed
+    if is_installed("pyenv"):
+        pyenv = PyenvVersion()
+    else:
+        pyenv = PyenvVersion.install()
+
+    # Ensure pyenv-virtualenv is installed
+    pyenv.ensure_plugin(PYENV_VIRTUALENV_URL)
+
+    # Ensure pyenv has a compatible version of python available
+    pyenv.ensure_python(PYTHON_CONSTRAINT, prerelease)
+
+    return pyenv
 
 
 def main():
@@ -279,34 +476,53 @@ def main():
         "--no-prerelease", action="store_false", dest="prerelease",
         help="Do not allow pre-release versions"
     )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=4,
+        help="Number of tools to install concurrently"
+    )
+    parser.add_argument(
+        "--wheelhouse", default=None,
+        help="Install tools only from the wheels in this directory (offline)"
+    )
+    parser.add_argument(
+        "--download", action="store_true",
+        help="Fill the --wheelhouse directory with wheels for all tools and exit"
+    )
+    parser.add_argument(
+        "--python", default=None,
+        help="Python to install tools with, and to build the wheelhouse with; "
+             "defaults to the pyenv python"
+    )
     parser.add_argument("version", help="Version constraint")
     args = parser.parse_args()
 
-    # Ensure pyenv is installed
-    if is_installed("pyenv"):
-        pyenv = PyenvVersion()
-    else:
-        pyenv = PyenvVersion.install()
+    if args.download and not args.wheelhouse:
+        parser.error("--download requires --wheelhouse")
 
-    # Ensure pyenv-virtualenv is installed
-    pyenv.ensure_plugin(PYENV_VIRTUALENV_URL)
+    pyenv = None
+    if not (args.download and args.python):
+        pyenv = ensure_pyenv(args.prerelease)
 
-    # Ensure pyenv has a compatible version of python available
-    pyenv.ensure_python(PYTHON_CONSTRAINT, args.prerelease)
+    # Resolve the python executable to use when installing tools with pipsi
+    python = args.python or pyenv.get_bin()
+
+    if args.download:
+        # Wheels are built by the same python that will install them
+        failed = download_wheelhouse(TOOLS, args.wheelhouse, python)
+        if failed:
+            sys.exit("Failed to build wheels for: {}".format(", ".join(failed)))
+        return
 
     # Ensure pipsi is installed
     if not is_installed("pipsi"):
         pyenv.pipe_to_python(["curl", "-L", PIPSI_URL])
 
-    # Resolve the python executable to use when installing tools with pipsi
-    python = pyenv.get_bin()
-
     # Install the tools
-    for name, constraints in TOOLS.items():
-        deps = None
-        if isinstance(constraints, tuple):
-            constraints, deps = constraints
-        install_tool(name, constraints, deps, python)
+    results = install_tools(TOOLS, python, args.jobs, args.wheelhouse)
+    print_timings(results)
+    failed = [name for name, _, error in results if error]
+    if failed:
+        sys.exit("Failed to install: {}".format(", ".join(failed)))
 
     # Disable automatic creation of virtualenvs by poetry
     run(["poetry", "config", "settings.virtualenvs.create", "false"])
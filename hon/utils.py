@@ -1,17 +1,24 @@
+from collections import deque
 from contextlib import contextmanager
 import os
 from pathlib import Path
+import resource
 from shlex import quote
 import subprocess
 import sys
-from typing import IO, List, Union
+import tempfile
+import threading
+from typing import IO, Iterator, List, Optional, Tuple, Union
 
 import toml
 
+from hon.profiling import profiled
+
 
 def read_toml(path: Path):
-    with open(path, "rt") as inp:
-        toml.load(inp)
+    with profiled(f"parse {path.name}", "hon", path=path):
+        with open(path, "rt") as inp:
+            return toml.load(inp)
 
 
 @contextmanager
@@ -24,46 +31,190 @@ def chdir(target: Path):
         os.chdir(curwd)
 
 
+STREAM = "stream"
+TAIL_LINES = 200
+
+
+class StreamCapture:
+    """
+    Output of a command captured with bounded memory. Only the last `tail_lines`
+    lines are kept in memory; the full output is spilled to a temporary log file,
+    which can be read back lazily, line by line.
+
+    Args:
+        echo: Stream to which output is forwarded as it is read; True for
+            sys.stdout, or False to capture silently.
+        tail_lines: Number of recent lines to keep in memory.
+    """
+    def __init__(self, echo: Union[bool, IO] = True, tail_lines: int = TAIL_LINES):
+        self.echo = sys.stdout if echo is True else (echo or None)
+        self.tail = deque(maxlen=tail_lines)
+        self._log = tempfile.NamedTemporaryFile(
+            prefix="hon-", suffix=".log", delete=False
+        )
+        self.log_path = Path(self._log.name)
+
+    def consume(self, stream: IO[bytes]):
+        for line in stream:
+            self._log.write(line)
+            text = line.decode("utf-8", "replace")
+            self.tail.append(text)
+            if self.echo:
+                self.echo.write(text)
+        self._log.flush()
+        if self.echo:
+            self.echo.flush()
+
+    def __iter__(self) -> Iterator[str]:
+        with open(self.log_path, "rt", encoding="utf-8", errors="replace") as inp:
+            yield from inp
+
+    def __str__(self):
+        return "".join(self.tail)
+
+    def close(self):
+        self._log.close()
+        if self.log_path.exists():
+            self.log_path.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _communicate(
+    proc: subprocess.Popen, input: Optional[bytes] = None
+) -> Tuple[Optional[bytes], Optional[bytes]]:
+    """
+    Like `Popen.communicate`, but does not wait for the process, which is left to
+    be reaped by the caller.
+    """
+    results = {}
+
+    def read(key: str, stream: IO[bytes]):
+        results[key] = stream.read()
+        stream.close()
+
+    def write(stream: IO[bytes]):
+        try:
+            stream.write(input)
+            stream.close()
+        except BrokenPipeError:
+            # The process exited without reading all of its input
+            pass
+
+    threads = []
+    if proc.stdin:
+        threads.append(threading.Thread(target=write, args=(proc.stdin,)))
+    if proc.stderr:
+        threads.append(
+            threading.Thread(target=read, args=("stderr", proc.stderr))
+        )
+    for thread in threads:
+        thread.start()
+    if proc.stdout:
+        read("stdout", proc.stdout)
+    for thread in threads:
+        thread.join()
+    return results.get("stdout"), results.get("stderr")
+
+
+def _wait(proc: subprocess.Popen) -> resource.struct_rusage:
+    """
+    Reaps a process with `os.wait4`, which also reports the process's own resource
+    usage, and sets its return code.
+    """
+    _, status, usage = os.wait4(proc.pid, 0)
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    return usage
+
+
 def run_cmd(
     cmd: List[str],
-    stdout: Union[bool, IO, None] = None,
+    stdout: Union[bool, str, IO, None] = None,
     stderr: Union[bool, IO, None] = None,
     shell: bool = False,
+    input: Optional[bytes] = None,
+    echo: Union[bool, IO] = True,
     **kwargs
 ):
     """
-    Execute a command in a subprocess.
+    Execute a command in a subprocess. When profiling is enabled, the command's
+    span records the CPU time and peak RSS of the child process itself.
 
     Args:
         cmd: List of command arguments.
-        stdout: If True, capture stdout and return it. If None, forward stdout to
-            sys.stdout. If a file-like object, write stdout to the file.
-        stderr: If True, capture stderr and return it. If None, forward stderr to
-            sys.stdout. If a file-like object, write stderr to the file.
+        stdout: If True, capture stdout and return it. If `STREAM`, forward stdout
+            to sys.stdout (or to `echo`) while capturing it with bounded memory,
+            and return a :class:`StreamCapture`, which the caller is responsible
+            for closing. If None, forward stdout to sys.stdout. If a file-like
+            object, write stdout to the file.
+        stderr: If True, capture stderr and attach it to the `CalledProcessError`
+            raised on failure. If None, forward stderr to sys.stderr. Otherwise,
+            a file-like object or `subprocess.STDOUT`.
         shell: Whether to execute the command using a shell.
-        **kwargs: Additional kwargs to `subprocess.check_output`.
+        input: Bytes to write to the command's stdin.
+        echo: With `stdout=STREAM`, the stream to which output is forwarded; False
+            to capture silently.
+        **kwargs: Additional kwargs to `subprocess.Popen`.
 
     Returns:
-        A tuple (stdout, stderr). Each will be None unless their respective
-        parameters were set to True.
+        The captured stdout if `stdout` is True, a :class:`StreamCapture` if
+        `stdout` is `STREAM`, otherwise 0.
+
+    Raises:
+        subprocess.CalledProcessError if the command fails. With `stdout=STREAM`,
+        its `output` is the :class:`StreamCapture`.
     """
-    if stdout is None:
-        kwargs["stdout"] = sys.stdout
-        proc_fn = subprocess.check_call
+    if stdout is True or stdout == STREAM:
+        kwargs["stdout"] = subprocess.PIPE
     else:
-        proc_fn = subprocess.check_output
-        if stdout is True:
-            kwargs["stdout"] = subprocess.PIPE
+        kwargs["stdout"] = sys.stdout if stdout is None else stdout
 
     if stderr is None:
         kwargs["stderr"] = sys.stderr
     elif stderr is True:
         kwargs["stderr"] = subprocess.PIPE
+    else:
+        kwargs["stderr"] = stderr
+
+    if input is not None:
+        kwargs["stdin"] = subprocess.PIPE
 
+    cmd_str = " ".join(quote(str(arg)) for arg in cmd)
     if shell:
-        cmd_str = " ".join(quote(arg) for arg in cmd)
         if "executable" not in kwargs:
             kwargs["executable"] = "/bin/bash"
-        return proc_fn(cmd_str, shell=True, **kwargs)
+        args = cmd_str
     else:
-        return proc_fn(cmd, shell=False, **kwargs)
+        args = cmd
+
+    capture = StreamCapture(echo) if stdout == STREAM else None
+    with profiled(os.path.basename(str(cmd[0])), "subprocess", cmd=cmd_str) as span:
+        try:
+            with subprocess.Popen(args, shell=shell, **kwargs) as proc:
+                if capture is not None:
+                    capture.consume(proc.stdout)
+                    output, errors = capture, None
+                else:
+                    output, errors = _communicate(proc, input)
+                usage = _wait(proc)
+        except BaseException:
+            if capture is not None:
+                capture.close()
+            raise
+        if span is not None:
+            span.append(usage)
+
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(
+            proc.returncode, args, output=output, stderr=errors
+        )
+    if stdout is True or stdout == STREAM:
+        return output
+    return 0
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from hon.changes import Changes
+
+
+OLD_BLOCKS = (
+    "## 0.2.0 (2019-02-01)\n\n* Second\n\n"
+    "## 0.1.0 (2019-01-01)\n\n* First\n    * Detail\n"
+)
+
+
+@pytest.fixture
+def changes_file(tmp_path):
+    path = tmp_path / "CHANGES.md"
+    path.write_text("# Changes\n\n" + OLD_BLOCKS)
+    return path
+
+
+def _changes(path):
+    return Changes(path, path.parent / ".hon" / "changes.json")
+
+
+def test_add_entry_to_empty_file(tmp_path):
+    path = tmp_path / "CHANGES.md"
+    path.write_text("")
+    changes = _changes(path)
+    changes.add_entry("x")
+    assert path.read_text() == "## Unreleased\n\n* x\n"
+    changes.add_entry("y", ["z"])
+    assert path.read_text() == "## Unreleased\n\n* x\n* y\n    * z\n"
+
+
+def test_add_entry_and_release(changes_file):
+    changes = _changes(changes_file)
+    changes.add_entry("Late")
+    assert changes_file.read_text() == "# Changes\n\n" + OLD_BLOCKS.replace(
+        "* Second\n", "* Second\n* Late\n"
+    )
+    changes_file.write_text("# Changes\n\n" + OLD_BLOCKS)
+
+    changes = _changes(changes_file)
+    changes.new_block()
+    changes.add_entry("Third")
+    assert changes.is_unreleased
+    assert changes_file.read_text() == (
+        "# Changes\n\n## Unreleased\n\n* Third\n\n" + OLD_BLOCKS
+    )
+    changes.add_entry("Fourth")
+    changes.set_title("0.3.0 (2019-03-01)")
+    assert changes_file.read_text() == (
+        "# Changes\n\n## 0.3.0 (2019-03-01)\n\n* Third\n* Fourth\n\n" + OLD_BLOCKS
+    )
+    assert changes.versions == ["0.3.0", "0.2.0", "0.1.0"]
+
+
+def test_new_block(changes_file):
+    changes = _changes(changes_file)
+    changes.new_block("0.3.0")
+    changes.add_entry("Third")
+    assert changes_file.read_text() == (
+        "# Changes\n\n## 0.3.0\n\n* Third\n\n" + OLD_BLOCKS
+    )
+    assert changes.find_block("0.2.0") == "## 0.2.0 (2019-02-01)\n\n* Second\n\n"
+
+
+def test_find_block_after_reopening(changes_file):
+    changes = _changes(changes_file)
+    changes.new_block()
+    changes.add_entry("Third")
+    changes.set_title("0.3.0")
+
+    reopened = _changes(changes_file)
+    # The index is loaded rather than rebuilt
+    reopened._scan_blocks = None
+    assert reopened.find_block("0.3.0") == "## 0.3.0\n\n* Third\n\n"
+    assert reopened.find_block("0.1.0") == (
+        "## 0.1.0 (2019-01-01)\n\n* First\n    * Detail\n"
+    )
+    assert reopened.find_block("0.0.1") is None
+
+
+def test_index_is_rebuilt_after_external_edit(changes_file):
+    changes = _changes(changes_file)
+    assert changes.versions == ["0.2.0", "0.1.0"]
+
+    text = changes_file.read_text().replace("* First\n", "* First, edited\n")
+    changes_file.write_text(text)
+    # Make sure the mtime differs even on filesystems with coarse timestamps
+    stat = changes_file.stat()
+    os.utime(str(changes_file), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    reopened = _changes(changes_file)
+    assert reopened.find_block("0.1.0") == (
+        "## 0.1.0 (2019-01-01)\n\n* First, edited\n    * Detail\n"
+    )
+    assert reopened.find_block("0.2.0") == "## 0.2.0 (2019-02-01)\n\n* Second\n\n"
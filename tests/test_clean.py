@@ -0,0 +1,72 @@
+from pathlib import Path
+import shutil
+import subprocess
+
+import pytest
+
+from hon.clean import IgnoreMatcher, delete_paths, iter_clean_candidates
+from hon.tools.git import Git
+
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("git") is None, reason="git is not installed"
+)
+
+
+def _git(root: Path, *args):
+    subprocess.check_call(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        + list(args),
+        cwd=str(root), stdout=subprocess.DEVNULL
+    )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    _git(tmp_path, "init", "--quiet")
+    (tmp_path / ".gitignore").write_text("*.log\nbuild/\n")
+    (tmp_path / "a.log").write_text("tracked")
+    (tmp_path / "b.log").write_text("ignored")
+    build = tmp_path / "build"
+    (build / "sub").mkdir(parents=True)
+    (build / "keep.txt").write_text("tracked")
+    (build / "out.o").write_text("ignored")
+    (build / "sub" / "out.o").write_text("ignored")
+    (tmp_path / "dist").mkdir()
+    (tmp_path / "dist" / "x.log").write_text("ignored")
+    (tmp_path / "new.txt").write_text("untracked")
+    _git(tmp_path, "add", ".gitignore")
+    _git(tmp_path, "add", "--force", "a.log", "build/keep.txt")
+    _git(tmp_path, "commit", "--quiet", "-m", "init")
+    return tmp_path
+
+
+def _candidates(root: Path, untracked: bool = False):
+    git = Git(working_dir=root)
+    return iter_clean_candidates(
+        root, IgnoreMatcher(), set(git.untracked_files) if untracked else None,
+        tracked=git.tracked_files
+    )
+
+
+def test_tracked_files_are_never_candidates(repo):
+    candidates = sorted(p.relative_to(repo).as_posix() for p in _candidates(repo))
+    assert candidates == ["b.log", "build/out.o", "build/sub", "dist/x.log"]
+
+
+def test_untracked_files_are_candidates(repo):
+    candidates = {
+        p.relative_to(repo).as_posix() for p in _candidates(repo, untracked=True)
+    }
+    assert "new.txt" in candidates
+    assert "a.log" not in candidates
+
+
+def test_delete_keeps_tracked_files(repo):
+    delete_paths(list(_candidates(repo)))
+    assert (repo / "a.log").exists()
+    assert (repo / "build" / "keep.txt").exists()
+    assert not (repo / "b.log").exists()
+    assert not (repo / "build" / "out.o").exists()
+    assert not (repo / "build" / "sub").exists()
+    assert (repo / "new.txt").exists()
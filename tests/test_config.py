@@ -0,0 +1,100 @@
+import os
+import stat
+
+import pytest
+
+from hon import config as config_module
+from hon.config import Config
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """
+    Records the name of every TOML file parsed by Config.
+    """
+    parsed = []
+    read_toml = config_module.read_toml
+
+    def recording_read_toml(path):
+        parsed.append(path.name)
+        return read_toml(path)
+
+    monkeypatch.setattr(config_module, "read_toml", recording_read_toml)
+    return parsed
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    path = tmp_path / "hon"
+    path.mkdir()
+    (path / "config.toml").write_text(
+        '[tools]\nblack = "/opt/black"\n\n'
+        '[repositories.private]\nupload_url = "https://pypi.example.com/"\n'
+        'password = "secret"\n'
+    )
+    return path
+
+
+@pytest.fixture
+def project_dir(tmp_path):
+    path = tmp_path / "project"
+    path.mkdir()
+    (path / "pyproject.toml").write_text('[tool.hon.clean]\npatterns = ["*.tmp"]\n')
+    return path
+
+
+def _touch(path, delta_ns=10 ** 9):
+    info = path.stat()
+    os.utime(str(path), ns=(info.st_atime_ns, info.st_mtime_ns + delta_ns))
+
+
+def test_snapshot_hit(config_dir, project_dir, parses):
+    first = Config(config_dir, project_dir, environ={})
+    assert parses == ["config.toml", "pyproject.toml"]
+    second = Config(config_dir, project_dir, environ={})
+    assert parses == ["config.toml", "pyproject.toml"]
+    assert second.get_tool("black") == "/opt/black"
+    assert second.get_clean_patterns() == ["*.tmp"]
+    assert second.get_repository("private") == first.get_repository("private")
+
+
+def test_snapshot_invalidated_by_mtime(config_dir, project_dir, parses):
+    Config(config_dir, project_dir, environ={})
+    _touch(project_dir / "pyproject.toml")
+    Config(config_dir, project_dir, environ={})
+    assert parses.count("pyproject.toml") == 2
+
+
+def test_snapshot_invalidated_by_size(config_dir, project_dir, parses):
+    Config(config_dir, project_dir, environ={})
+    config_file = config_dir / "config.toml"
+    mtime = config_file.stat().st_mtime_ns
+    config_file.write_text('[tools]\nblack = "/usr/local/bin/black"\n')
+    # Same mtime, so only the size differs
+    os.utime(str(config_file), ns=(mtime, mtime))
+    config = Config(config_dir, project_dir, environ={})
+    assert parses.count("config.toml") == 2
+    assert config.get_tool("black") == "/usr/local/bin/black"
+
+
+def test_snapshot_invalidated_by_environment(config_dir, project_dir, parses):
+    Config(config_dir, project_dir, environ={})
+    config = Config(config_dir, project_dir, environ={"HON_TOOL_BLACK": "black2"})
+    assert parses.count("config.toml") == 2
+    assert config.get_tool("black") == "black2"
+
+
+def test_snapshot_is_private(config_dir, project_dir):
+    config = Config(config_dir, project_dir, environ={})
+    assert stat.S_IMODE(config.snapshot_path.stat().st_mode) == 0o600
+
+
+def test_parsed_pyproject_is_reused(tmp_path, project_dir, parses, monkeypatch):
+    # Without a config directory there is no snapshot
+    monkeypatch.setattr(config_module, "DEFAULT_PATH", tmp_path / "missing")
+    config = Config(
+        project_dir=project_dir, environ={},
+        pyproject={"tool": {"hon": {"clean": {"patterns": ["*.bak"]}}}}
+    )
+    assert parses == []
+    assert config.get_clean_patterns() == ["*.bak"]
@@ -0,0 +1,25 @@
+from hon.docs import DocsStamp
+
+
+def test_stamp_ignores_build_output(tmp_path):
+    docs_dir = tmp_path / "docs"
+    (docs_dir / "_build" / "html").mkdir(parents=True)
+    (docs_dir / "api").mkdir()
+    (docs_dir / "index.rst").write_text("Index\n")
+    (docs_dir / "api" / "hon.rst").write_text("API\n")
+    (docs_dir / "_build" / "html" / "index.html").write_text("<html></html>")
+    package_dir = tmp_path / "pkg"
+    package_dir.mkdir()
+    (package_dir / "__init__.py").write_text('"""Package."""\n')
+
+    stamp = DocsStamp(tmp_path / "stamp.json")
+    fingerprint = stamp.compute(docs_dir, package_dir, docs_dir / "_build")
+    assert list(stamp.files) == [
+        str(docs_dir / "api" / "hon.rst"), str(docs_dir / "index.rst"),
+        str(package_dir / "__init__.py")
+    ]
+
+    (docs_dir / "_build" / "html" / "new.html").write_text("<html></html>")
+    assert stamp.compute(docs_dir, package_dir, docs_dir / "_build") == fingerprint
+    (docs_dir / "index.rst").write_text("Index, edited\n")
+    assert stamp.compute(docs_dir, package_dir, docs_dir / "_build") != fingerprint
@@ -0,0 +1,44 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from hon.tools.git import Git
+
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("git") is None, reason="git is not installed"
+)
+
+
+@pytest.fixture
+def git(tmp_path):
+    git = Git.init(tmp_path)
+    yield git
+    git.close()
+
+
+def test_add_non_utf8_names(tmp_path, git):
+    name = os.fsdecode(b"caf\xe9.txt")
+    (tmp_path / name).write_text("latin-1")
+    (tmp_path / ":literal*.txt").write_text("pathspec magic")
+    git.add(git.untracked_files)
+    assert sorted(git.tracked_files) == sorted([name, ":literal*.txt"])
+
+
+def test_read_missing_object(tmp_path, git):
+    (tmp_path / "a b.txt").write_text("content")
+    git.add(["a b.txt"])
+    subprocess.check_call(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com",
+         "commit", "--quiet", "-m", "init"],
+        cwd=str(tmp_path)
+    )
+    assert git.read_object("HEAD:a b.txt") == ("blob", b"content")
+    with pytest.raises(KeyError):
+        git.read_object("HEAD:c d.txt")
+    with pytest.raises(KeyError):
+        git.read_object("0" * 40)
+    # The process is still usable after a missing object
+    assert git.read_object("HEAD:a b.txt") == ("blob", b"content")
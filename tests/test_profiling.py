@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+import pytest
+
+from hon import profiling
+from hon.utils import STREAM, run_cmd
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    profiler = profiling.Profiler()
+    monkeypatch.setattr(profiling, "PROFILER", profiler)
+    return profiler
+
+
+def test_command_spans_report_the_child_process(profiler):
+    # The large child runs first, so a process-wide high-water mark would also be
+    # reported for the small one
+    run_cmd([sys.executable, "-c", "x = b'1' * (200 * 1024 * 1024)"])
+    run_cmd(["true"])
+    large, small = profiler.spans
+    assert large.peak_rss > 200 * 1024
+    assert small.peak_rss < 50 * 1024
+
+
+def test_run_cmd_results(profiler):
+    assert run_cmd(["cat"], stdout=True, input=b"abc") == b"abc"
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        run_cmd(
+            ["sh", "-c", "echo out; echo err >&2; exit 3"], stdout=True, stderr=True
+        )
+    assert (err.value.returncode, err.value.output, err.value.stderr) == (
+        3, b"out\n", b"err\n"
+    )
+    with run_cmd(["echo", "streamed"], stdout=STREAM, echo=False) as capture:
+        assert list(capture) == ["streamed\n"]
+    assert len(profiler.spans) == 3
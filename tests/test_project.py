@@ -0,0 +1,90 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from hon import CommandError
+from hon.project import Project
+from hon.tools.docker import CacheStats
+
+
+PYPROJECT = """
+[tool.poetry]
+name = "my-pkg"
+version = "0.1.0"
+description = ""
+authors = ["Test <test@example.com>"]
+
+[tool.poetry.dependencies]
+python = "^3.6"
+"""
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "pyproject.toml").write_text(PYPROJECT)
+    return Project(tmp_path)
+
+
+def test_dist_files(project):
+    dist_dir = project.root_dir / "dist"
+    dist_dir.mkdir()
+    for name in [
+        "my_pkg-0.1.0-py3-none-any.whl",
+        "my-pkg-0.1.0.tar.gz",
+        "my_pkg-0.1.0.post1-py3-none-any.whl",
+        "my-pkg-0.1.0.post1.tar.gz",
+        "my_pkg_extra-0.1.0-py3-none-any.whl",
+        "my_pkg-0.1.0-py3-none-any.whl.asc",
+    ]:
+        (dist_dir / name).write_bytes(b"")
+    assert [path.name for path in project.dist_files] == [
+        "my-pkg-0.1.0.tar.gz", "my_pkg-0.1.0-py3-none-any.whl"
+    ]
+
+
+class _Docker:
+    def build(self, tag, dockerfile, context):
+        self.tag = tag
+        self.dockerfile = dockerfile.read_text()
+        return CacheStats({}, [])
+
+
+def test_generated_dockerfile_copies_the_wheel(project):
+    (project.root_dir / "poetry.lock").write_text(
+        '[[package]]\nname = "dep"\nversion = "1.0"\ncategory = "main"\n'
+        'python-versions = "*"\n'
+    )
+    docker = _Docker()
+    project.docker_build(docker, cmd=["my-pkg"])
+    assert docker.tag == "my-pkg:0.1.0"
+    assert "FROM python:3.6-slim\n" in docker.dockerfile
+    assert "COPY dist/my_pkg-0.1.0-py3-none-any.whl /tmp/\n" in docker.dockerfile
+    assert "pip install --no-deps /tmp/my_pkg-0.1.0-py3-none-any.whl\n" in \
+        docker.dockerfile
+
+
+def test_cache_stats_ignore_base_image():
+    stats = CacheStats.parse([
+        "#5 [1/3] FROM docker.io/library/python:3.6-slim\n",
+        "#5 DONE 0.0s\n",
+        "#6 [2/3] COPY .hon/docker/requirements.txt /tmp/requirements.txt\n",
+        "#6 CACHED\n",
+        "#7 [3/3] COPY dist/my_pkg-0.1.0-py3-none-any.whl /tmp/\n",
+        "#7 DONE 0.1s\n",
+    ])
+    assert (stats.hits, stats.misses) == (1, 1)
+
+
+def test_lint_failure_points_to_log(project, tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    flake8 = bin_dir / "flake8"
+    flake8.write_text("#!/bin/sh\necho 'flake8: crashed'\nexit 2\n")
+    flake8.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    with pytest.raises(CommandError, match="full output is in") as err:
+        project.lint()
+    log_path = Path(str(err.value).rsplit(" ", 1)[1])
+    assert log_path.read_text() == "flake8: crashed\n"
+    log_path.unlink()
@@ -0,0 +1,148 @@
+import hashlib
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import re
+import threading
+
+import pytest
+
+from hon import CommandError
+from hon.publish import Artifact, Repository, UploadState, upload_artifacts
+
+
+class StandInIndex(HTTPServer):
+    """
+    Minimal repository implementing the legacy upload API and a simple index,
+    which lists every file uploaded so far.
+    """
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.files = {}
+        self.uploads = []
+        self.index_auth = []
+        # Maps filename to a list of statuses returned by successive uploads
+        self.responses = {}
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.index_auth.append(self.headers.get("Authorization"))
+        links = "".join(
+            f'<a href="/files/{name}#sha256={digest}">{name}</a>'
+            for name, digest in self.server.files.items()
+        )
+        body = f"<html><body>{links}</body></html>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        filename = re.search(rb'filename="([^"]+)"', body).group(1).decode()
+        digest = re.search(
+            rb'name="sha256_digest"\r\n\r\n([0-9a-f]+)', body
+        ).group(1).decode()
+        self.server.uploads.append(filename)
+        statuses = self.server.responses.get(filename)
+        status = statuses.pop(0) if statuses else 200
+        if status == 200:
+            self.server.files[filename] = digest
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+@pytest.fixture
+def index():
+    server = StandInIndex()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def repository(index):
+    return Repository(
+        upload_url=f"{index.url}/legacy/", index_url=f"{index.url}/simple/",
+        username="user", password="secret", retries=1
+    )
+
+
+def _artifact(tmp_path, name: str, content: bytes) -> Artifact:
+    path = tmp_path / name
+    path.write_bytes(content)
+    return Artifact(path)
+
+
+def test_skips_files_the_index_has(tmp_path, index, repository):
+    existing = _artifact(tmp_path, "demo-0.1.0.tar.gz", b"sdist")
+    index.files[existing.name] = hashlib.sha256(b"sdist").hexdigest()
+    wheel = _artifact(tmp_path, "demo-0.1.0-py3-none-any.whl", b"wheel")
+
+    uploaded, skipped = upload_artifacts(
+        [existing, wheel], repository, "demo", "0.1.0"
+    )
+    assert [a.name for a in uploaded] == [wheel.name]
+    assert [a.name for a in skipped] == [existing.name]
+    assert index.uploads == [wheel.name]
+    assert index.index_auth == ["Basic dXNlcjpzZWNyZXQ="]
+
+
+def test_identical_files_are_uploaded_once(tmp_path, index, repository):
+    wheel = _artifact(tmp_path, "demo-0.1.0-py3-none-any.whl", b"wheel")
+    uploaded, skipped = upload_artifacts(
+        [wheel, Artifact(wheel.path)], repository, "demo", "0.1.0"
+    )
+    assert len(uploaded) == 1
+    assert len(skipped) == 1
+    assert index.uploads == [wheel.name]
+
+
+def test_failed_upload_is_resumed(tmp_path, index, repository):
+    state = UploadState(tmp_path / "state.json")
+    sdist = _artifact(tmp_path, "demo-0.1.0.tar.gz", b"sdist")
+    wheel = _artifact(tmp_path, "demo-0.1.0-py3-none-any.whl", b"wheel")
+    index.responses[wheel.name] = [400]
+
+    with pytest.raises(CommandError, match="1 of 2 uploads failed"):
+        upload_artifacts([sdist, wheel], repository, "demo", "0.1.0", state)
+    # Client errors are not retried
+    assert sorted(index.uploads) == sorted([sdist.name, wheel.name])
+    assert UploadState(state.path).uploaded == {sdist.sha256}
+
+    # Without a remote index, the rerun relies on the recorded state
+    repository.index_url = None
+    uploaded, skipped = upload_artifacts(
+        [sdist, wheel], repository, "demo", "0.1.0", UploadState(state.path)
+    )
+    assert [a.name for a in uploaded] == [wheel.name]
+    assert [a.name for a in skipped] == [sdist.name]
+    assert index.uploads.count(sdist.name) == 1
+
+
+def test_server_errors_are_retried(tmp_path, index, repository, monkeypatch):
+    monkeypatch.setattr("hon.publish.time.sleep", lambda seconds: None)
+    wheel = _artifact(tmp_path, "demo-0.1.0-py3-none-any.whl", b"wheel")
+    index.responses[wheel.name] = [503]
+
+    uploaded, _ = upload_artifacts([wheel], repository, "demo", "0.1.0")
+    assert [a.name for a in uploaded] == [wheel.name]
+    assert index.uploads == [wheel.name, wheel.name]
+
+
+def test_index_url_defaults_only_for_known_repositories(tmp_path, monkeypatch):
+    monkeypatch.setattr("hon.publish.PYPIRC", tmp_path / ".pypirc")
+    assert Repository.from_config("pypi").index_url == "https://pypi.org/simple/"
+    private = Repository.from_config(
+        "private", {"upload_url": "https://pypi.example.com/legacy/"}
+    )
+    assert private.index_url is None
@@ -0,0 +1,101 @@
+from packaging.specifiers import SpecifierSet
+
+from hon.requirements import (
+    constraint_marker, constraint_specifiers, evaluate_marker, versions_equal
+)
+from hon.sync import SyncPlan, installed_distributions, locked_packages
+
+
+def test_versions_equal():
+    assert versions_equal("1.0.0-beta.1", "1.0.0b1")
+    assert versions_equal("1.0", "1.0.0")
+    assert not versions_equal("1.0", "1.0.1")
+
+
+def test_plan_normalizes_versions():
+    plan = SyncPlan.compute(
+        {"x": ("x", "1.0.0-beta.1", "x==1.0.0-beta.1")}, {"x": ("x", "1.0.0b1")}
+    )
+    assert plan.is_empty
+
+
+LINUX = {
+    "sys_platform": "linux", "platform_system": "Linux", "python_version": "3.8",
+    "python_full_version": "3.8.10"
+}
+
+
+def test_markers():
+    assert not evaluate_marker('sys_platform == "win32"', LINUX)
+    assert evaluate_marker(
+        'python_version >= "3.6" and (sys_platform != "win32" or extra == "x")',
+        LINUX
+    )
+    assert not evaluate_marker('python_full_version != "3.8.*"', LINUX)
+    assert evaluate_marker(None, LINUX)
+
+
+def test_constraint_specifiers():
+    assert constraint_specifiers("^0.4.0") == [SpecifierSet(">=0.4.0,<0.5")]
+    assert constraint_specifiers("~2.7 || ^3.5") == [
+        SpecifierSet(">=2.7,<2.8"), SpecifierSet(">=3.5,<4")
+    ]
+    assert constraint_specifiers("*") == []
+    assert constraint_marker(">=2.7, !=3.0.*") == (
+        'python_full_version >= "2.7" and python_full_version != "3.0.*"'
+    )
+
+
+def test_locked_packages_filters_environment(tmp_path):
+    lock_file = tmp_path / "poetry.lock"
+    lock_file.write_text(
+        '[[package]]\nname = "dep"\nversion = "1.0"\npython-versions = "*"\n\n'
+        '[[package]]\nname = "pywin32"\nversion = "227"\npython-versions = "*"\n'
+        'marker = "sys_platform == \\"win32\\""\n\n'
+        '[[package]]\nname = "py2only"\nversion = "1.0"\n'
+        'python-versions = ">=2.7,<3.0"\n'
+    )
+    assert list(locked_packages(lock_file, environment=LINUX)) == ["dep"]
+    assert len(locked_packages(lock_file)) == 3
+
+
+def test_locked_packages_from_other_sources(tmp_path):
+    lock_file = tmp_path / "poetry.lock"
+    lock_file.write_text(
+        '[[package]]\nname = "dep"\nversion = "1.0"\n\n'
+        '[[package]]\nname = "fork"\nversion = "2.0"\n'
+        '[package.source]\ntype = "git"\nurl = "https://example.com/fork.git"\n'
+        'reference = "main"\nresolved_reference = "abc123"\n\n'
+        '[[package]]\nname = "local"\nversion = "0.1"\n'
+        '[package.source]\ntype = "directory"\nurl = "../local"\n'
+    )
+    requirements = {
+        key: requirement
+        for key, (_, _, requirement) in locked_packages(lock_file).items()
+    }
+    assert requirements == {
+        "dep": "dep==1.0",
+        "fork": "fork @ git+https://example.com/fork.git@abc123",
+        "local": f"local @ {(tmp_path.parent / 'local').resolve().as_uri()}",
+    }
+
+
+def test_installed_distributions(tmp_path):
+    (tmp_path / "wheel_pkg-1.0.dist-info").mkdir()
+    (tmp_path / "egg_pkg-2.0-py3.8.egg-info").mkdir()
+    (tmp_path / "flat_egg-3.0.egg-info").write_text("Name: flat-egg\n")
+    (tmp_path / "weird.egg-info").mkdir()
+    (tmp_path / "weird.egg-info" / "PKG-INFO").write_text(
+        "Metadata-Version: 1.0\nName: weird\nVersion: 4.0\n\nBody\n"
+    )
+    assert installed_distributions(tmp_path) == {
+        "wheel-pkg": ("wheel_pkg", "1.0"),
+        "egg-pkg": ("egg_pkg", "2.0"),
+        "flat-egg": ("flat_egg", "3.0"),
+        "weird": ("weird", "4.0"),
+    }
+    plan = SyncPlan.compute(
+        {"egg-pkg": ("egg-pkg", "2.0", "egg-pkg==2.0")},
+        installed_distributions(tmp_path), keep=["wheel-pkg", "flat-egg", "weird"]
+    )
+    assert plan.is_empty